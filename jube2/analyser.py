@@ -22,17 +22,229 @@ from __future__ import (print_function,
                         division)
 
 import xml.etree.ElementTree as ET
+import bisect
 import jube2.log
+import jube2.conf
 import os
 import re
+import mmap
+import locale
 import glob
 import math
+import hashlib
+import sqlite3
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 import jube2.pattern
 import jube2.util.util
 import jube2.util.output
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 LOGGER = jube2.log.get_logger(__name__)
 
+# Aggregated pattern values, which are only needed to combine the matches
+# of multiple files and are not part of the analyse result
+_INTERNAL_VALUES = ("m2", "sketch")
+
+# (pattern value, flags) -> (compiled regex, line local state)
+_REGEX_CACHE = dict()
+# tuple of line local regex strings -> combined regex
+_SCANNER_CACHE = dict()
+# Regex elements which can match (or look at) more than a single line, or
+# which cannot be used inside of a combined regex (group references, flags)
+_NOT_LINE_LOCAL_REGEX = \
+    re.compile(r"\n|\\[nsWDZAtrfvxuUN0-9]|\[\^|\(\?(?![:=!#]|<[=!])")
+
+
+def _compile_regex(value, flags):
+    """Return compiled regex and its line local state, reuse already
+    compiled regex if possible"""
+    key = (value, flags)
+    if key not in _REGEX_CACHE:
+        if len(_REGEX_CACHE) >= jube2.conf.MAX_REGEX_CACHE_SIZE:
+            _REGEX_CACHE.clear()
+        line_local = (not flags & re.DOTALL) and \
+            (_NOT_LINE_LOCAL_REGEX.search(value) is None)
+        _REGEX_CACHE[key] = (re.compile(value, flags), line_local)
+    return _REGEX_CACHE[key]
+
+
+def _combined_scanner(regex_list):
+    """Return a single regex matching any of the given line local regex or
+    None if they cannot be combined"""
+    key = tuple(regex.pattern for regex in regex_list)
+    if key not in _SCANNER_CACHE:
+        if len(_SCANNER_CACHE) >= jube2.conf.MAX_REGEX_CACHE_SIZE:
+            _SCANNER_CACHE.clear()
+        try:
+            _SCANNER_CACHE[key] = re.compile(
+                "|".join("(?:{0})".format(value) for value in key),
+                re.MULTILINE)
+        except re.error:
+            _SCANNER_CACHE[key] = None
+    return _SCANNER_CACHE[key]
+
+
+def _match_regions(data, scanner):
+    """Return (start, end) regions of all lines in data which contain a
+    match of scanner. Adjacent lines are combined to a single region."""
+    regions = list()
+    for match in scanner.finditer(data):
+        pos = match.start()
+        if len(regions) > 0 and pos <= regions[-1][1]:
+            continue
+        start = data.rfind("\n", 0, pos) + 1
+        end = data.find("\n", pos)
+        if end < 0:
+            end = len(data)
+        if len(regions) > 0 and start == regions[-1][1] + 1:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    return regions
+
+
+def _scan_data(data, regex_list):
+    """Return the result of re.findall for each given (regex, line local
+    state) tuple. All line local regex are handled by a single combined pass
+    over data, afterwards they only scan the lines containing any match."""
+    matches = [None] * len(regex_list)
+    line_local = [i for i, (regex, local) in enumerate(regex_list) if local]
+    if len(line_local) > 1:
+        scanner = _combined_scanner(
+            [regex_list[i][0] for i in line_local])
+        if scanner is not None:
+            regions = _match_regions(data, scanner)
+            for i in line_local:
+                regex = regex_list[i][0]
+                matches[i] = list()
+                for start, end in regions:
+                    matches[i] += regex.findall(data, start, end)
+    for i, (regex, local) in enumerate(regex_list):
+        if matches[i] is None:
+            matches[i] = regex.findall(data)
+    return matches
+
+
+def _statistics(values):
+    """Return sum, sum2, min, max, avg and the sum of squared deviations m2
+    of the given numbers. The deviations are calculated in a second pass
+    to avoid the cancellation of the sum of squares."""
+    cnt = len(values)
+    result = {"min": min(values), "max": max(values)}
+    if jube2.conf.PATTERN_PERCENTILES:
+        result["sketch"] = _percentile_sketch(values)
+    try:
+        if all(type(value) is int for value in values):
+            # Keep exact integer sums
+            result["sum"] = sum(values)
+            result["sum2"] = sum(value * value for value in values)
+            avg = result["sum"] / cnt
+            result["m2"] = math.fsum((value - avg) * (value - avg)
+                                     for value in values)
+        elif numpy is not None:
+            array = numpy.array(values, dtype=float)
+            with numpy.errstate(over="ignore", invalid="ignore"):
+                result["sum"] = float(numpy.sum(array))
+                result["sum2"] = float(numpy.sum(array * array))
+                avg = result["sum"] / cnt
+                result["m2"] = float(numpy.sum((array - avg) ** 2))
+        else:
+            result["sum"] = math.fsum(values)
+            result["sum2"] = math.fsum(value * value for value in values)
+            avg = result["sum"] / cnt
+            result["m2"] = math.fsum((value - avg) * (value - avg)
+                                     for value in values)
+    except OverflowError:
+        result.setdefault("sum", math.nan)
+        result.setdefault("sum2", math.nan)
+        avg = math.nan
+        result["m2"] = math.nan
+    if isinstance(result["sum2"], float) and math.isinf(result["sum2"]) and \
+            not any(abs(value) == math.inf for value in values):
+        LOGGER.warning("Squared sum cannot be represented, " +
+                       "numerical result out of range.")
+        result["sum2"] = math.nan
+    result["avg"] = avg
+    return result
+
+
+def _percentile_sketch(values):
+    """Return a percentile sketch of the given numbers: a list of
+    [value, weight] centroids, which is compressed if it gets longer than
+    conf.PATTERN_PERCENTILE_SKETCH_SIZE. None marks numbers which cannot be
+    ordered (NaN or too large for a float)."""
+    try:
+        sketch = [[float(value), 1] for value in values]
+    except OverflowError:
+        return None
+    if any(value != value for value, _ in sketch):
+        return None
+    return _compress_sketch(sketch)
+
+
+def _compress_sketch(sketch):
+    """Merge neighbouring centroids of equal total weight, if the sketch is
+    too long"""
+    if len(sketch) <= jube2.conf.PATTERN_PERCENTILE_SKETCH_SIZE:
+        return sketch
+    sketch.sort()
+    group_weight = sum(weight for _, weight in sketch) / \
+        (jube2.conf.PATTERN_PERCENTILE_SKETCH_SIZE // 2)
+    compressed = list()
+    value_sum = 0.0
+    weight_sum = 0
+    for value, weight in sketch:
+        value_sum += value * weight
+        weight_sum += weight
+        if weight_sum >= group_weight:
+            compressed.append([value_sum / weight_sum, weight_sum])
+            value_sum = 0.0
+            weight_sum = 0
+    if weight_sum > 0:
+        compressed.append([value_sum / weight_sum, weight_sum])
+    return compressed
+
+
+def _percentiles(values):
+    """Return the percentiles given by conf.PATTERN_PERCENTILES of the
+    aggregated values of a pattern (linear interpolation between the
+    closest ranks). The result is exact as long as the percentile sketch
+    was not compressed."""
+    percentiles = jube2.conf.PATTERN_PERCENTILES
+    if values["sketch"] is None:
+        results = [math.nan] * len(percentiles)
+    else:
+        # Rank of every centroid, the rank of a centroid with a weight
+        # greater than one is the center of all numbers it represents
+        ranks = [0]
+        points = [float(values["min"])]
+        rank = 0
+        for value, weight in sorted(values["sketch"]):
+            ranks.append(rank + (weight - 1) / 2)
+            points.append(value)
+            rank += weight
+        ranks.append(rank - 1)
+        points.append(float(values["max"]))
+        results = list()
+        for percentile in percentiles:
+            rank = (values["cnt"] - 1) * percentile / 100
+            upper = min(bisect.bisect_left(ranks, rank), len(ranks) - 1)
+            lower = max(upper - 1, 0)
+            if ranks[upper] == ranks[lower]:
+                results.append(points[upper])
+            else:
+                results.append(
+                    points[lower] + (points[upper] - points[lower]) *
+                    (rank - ranks[lower]) / (ranks[upper] - ranks[lower]))
+    return dict(("p{0}".format(percentile), value)
+                for percentile, value in zip(percentiles, results))
+
 
 class Analyser(object):
 
@@ -43,9 +255,10 @@ class Analyser(object):
 
         """A file which should be analysed"""
 
-        def __init__(self, path):
+        def __init__(self, path, stream=False):
             self._path = path
             self._use = set()
+            self._stream = stream
 
         def add_uses(self, use_names):
             """Add an addtional patternset name"""
@@ -57,7 +270,8 @@ class Analyser(object):
 
         def __eq__(self, other):
             result = len(self._use.symmetric_difference(other.use)) == 0
-            return result and (self._path == other.path)
+            return result and (self._path == other.path) and \
+                (self._stream == other.stream)
 
         def __repr__(self):
             return "AnalyseFile({0})".format(self._path)
@@ -72,6 +286,11 @@ class Analyser(object):
             """Get file path"""
             return self._path
 
+        @property
+        def stream(self):
+            """File should be scanned in streaming mode"""
+            return self._stream
+
         def etree_repr(self):
             """Return etree object representation"""
             file_etree = ET.Element("file")
@@ -79,6 +298,8 @@ class Analyser(object):
             if len(self._use) > 0:
                 file_etree.attrib["use"] = \
                     jube2.conf.DEFAULT_SEPARATOR.join(self._use)
+            if self._stream:
+                file_etree.attrib["stream"] = "true"
             return file_etree
 
     def __init__(self, name, reduce_iteration=True):
@@ -88,6 +309,8 @@ class Analyser(object):
         self._benchmark = None
         self._analyse_result = None
         self._reduce_iteration = reduce_iteration
+        self._file_index = dict()
+        self._used_file_index = dict()
 
     @property
     def benchmark(self):
@@ -119,6 +342,17 @@ class Analyser(object):
         """Set analyse result"""
         self._analyse_result = analyse_result
 
+    @property
+    def file_index(self):
+        """Return file index: (file path, pattern hash) -> (size, mtime,
+        match_dict) of all files scanned by the last analyse"""
+        return self._file_index
+
+    @file_index.setter
+    def file_index(self, file_index):
+        """Set file index of a previous analyse"""
+        self._file_index = file_index
+
     def add_analyse(self, step_name, analyse_file):
         """Add an addtional analyse file"""
         if step_name not in self._analyse:
@@ -172,15 +406,14 @@ class Analyser(object):
                                            ",".join(incompatible_names)))
             patternset.add_patternset(self._benchmark.patternsets[use])
 
-    def analyse(self):
-        """Run the analyser"""
+    def analyse(self, procs=1):
+        """Run the analyser. If procs > 1, the workpackages are analysed by
+        procs worker processes."""
         LOGGER.debug("Run analyser \"{0}\"".format(self._name))
         if self._benchmark is None:
             raise RuntimeError("No benchmark found using analyser {0}"
                                .format(self._name))
 
-        result = dict()
-
         # Combine all patternsets
         patternset = jube2.pattern.Patternset()
         self._combine_and_check_patternsets(patternset, self._use)
@@ -204,110 +437,178 @@ class Analyser(object):
                 align_right=False)
         LOGGER.debug(debugstr)
 
+        groups = dict()
         for stepname in self._analyse:
-            result[stepname] = dict()
-            LOGGER.debug("  analyse step \"{0}\"".format(stepname))
             if stepname not in self._benchmark.steps:
                 raise RuntimeError(("Could not find <step name=\"{0}\"> "
                                     "when using analyser \"{1}\"").format(
                                         stepname, self._name))
-            step = self._benchmark.steps[stepname]
-            workpackages = set(self._benchmark.workpackages[stepname])
-            while len(workpackages) > 0:
-                root_workpackage = workpackages.pop()
-                match_dict = dict()
-                # Global patternset to store all existing pattern (e.g. from
-                # individual file uses), necessary to evaluate default pattern
-                # and derived pattern
-                global_patternset = patternset.copy()
-                result[stepname][root_workpackage.id] = dict()
-                # Should multiple iterations be reduced to a single result line
-                if self._reduce_iteration:
-                    siblings = set(root_workpackage.iteration_siblings)
-                else:
-                    siblings = set([root_workpackage])
-                while len(siblings) > 0:
-                    workpackage = siblings.pop()
-                    if workpackage in workpackages:
-                        workpackages.remove(workpackage)
-
-                    # Ignore workpackages not started yet
-                    if not workpackage.started:
-                        continue
-
-                    parameter = \
-                        dict([[par.name, par.value] for par in
-                              workpackage.parameterset.
-                              constant_parameter_dict.values()])
-
-                    for file_obj in self._analyse[stepname]:
-                        if step.alt_work_dir is not None:
-                            file_path = step.alt_work_dir
-                            file_path = jube2.util.util.substitution(
-                                file_path, parameter)
-                            file_path = \
-                                os.path.expandvars(
-                                    os.path.expanduser(file_path))
-                            file_path = os.path.join(
-                                self._benchmark.file_path_ref, file_path)
-                        else:
-                            file_path = workpackage.work_dir
-
-                        filename = \
-                            jube2.util.util.substitution(file_obj.path,
-                                                         parameter)
-                        filename = \
-                            os.path.expandvars(os.path.expanduser(filename))
-
-                        file_path = os.path.join(file_path, filename)
-                        for path in glob.glob(file_path):
-                            # scan files
-                            LOGGER.debug(("    scan file {0}").format(path))
-
-                            new_result_dict, match_dict = \
-                                self._analyse_file(path, patternset,
-                                                   global_patternset,
-                                                   workpackage.parameterset,
-                                                   match_dict,
-                                                   file_obj.use)
-                            result[stepname][root_workpackage.id].update(
-                                new_result_dict)
-
-                # Set default pattern values if available and necessary
-                new_result_dict = result[stepname][root_workpackage.id]
-                for pattern in global_patternset.pattern_storage:
-                    if (pattern.default_value is not None) and \
-                            (pattern.name not in new_result_dict):
-                        default = pattern.default_value
-                        # Convert default value
-                        if pattern.content_type == "int":
-                            if default == "nan":
-                                default = float("nan")
-                            else:
-                                default = int(float(default))
-                        elif pattern.content_type == "float":
-                            default = float(default)
-                        new_result_dict[pattern.name] = default
-                        new_result_dict[pattern.name + "_cnt"] = 0
-                        new_result_dict[pattern.name + "_first"] = default
-                        new_result_dict[pattern.name + "_last"] = default
-                        if pattern.content_type in ["int", "float"]:
-                            new_result_dict.update(
-                                {pattern.name + "_sum": default,
-                                 pattern.name + "_min": default,
-                                 pattern.name + "_max": default,
-                                 pattern.name + "_avg": default,
-                                 pattern.name + "_sum2": default ** 2,
-                                 pattern.name + "_std": 0})
-
-                # Evaluate derived pattern
-                new_result_dict = self._eval_derived_pattern(
-                    global_patternset, root_workpackage.parameterset,
-                    result[stepname][root_workpackage.id])
-                result[stepname][root_workpackage.id].update(
-                    new_result_dict)
+            groups[stepname] = self._workpackage_groups(stepname)
+
+        group_results = dict()
+        file_index = dict()
+        if procs > 1:
+            worker_pool = jube2.util.util.WorkerPool(procs)
+            try:
+                # Each worker process gets an interleaved part of the
+                # workpackage groups of each step
+                for stepname in self._analyse:
+                    for i in range(min(procs, len(groups[stepname]))):
+                        worker_pool.submit(
+                            stepname, self._analyse_groups,
+                            (stepname, groups[stepname][i::procs],
+                             patternset))
+                while worker_pool.running() > 0:
+                    stepname, value, error = worker_pool.wait()
+                    if error is not None:
+                        raise error
+                    group_results.update(value[0])
+                    file_index.update(value[1])
+            except BaseException:
+                worker_pool.terminate()
+                raise
+            worker_pool.close()
+        else:
+            for stepname in self._analyse:
+                value = self._analyse_groups(stepname, groups[stepname],
+                                             patternset)
+                group_results.update(value[0])
+                file_index.update(value[1])
+
+        # Merge results in workpackage order, independent of the order in
+        # which the worker processes finished
+        result = dict()
+        for stepname in self._analyse:
+            result[stepname] = dict()
+            for root_id, _ in groups[stepname]:
+                result[stepname][root_id] = group_results[root_id]
 
         self._analyse_result = result
+        self._file_index = file_index
+
+    def _workpackage_groups(self, stepname):
+        """Return list of (root workpackage id, workpackage ids) tuples
+        of all workpackage groups of the given step, which are analysed
+        together"""
+        groups = list()
+        workpackages = set(self._benchmark.workpackages[stepname])
+        for root_workpackage in sorted(workpackages, key=lambda wp: wp.id):
+            if root_workpackage not in workpackages:
+                continue
+            # Should multiple iterations be reduced to a single result line
+            if self._reduce_iteration:
+                siblings = set(root_workpackage.iteration_siblings)
+            else:
+                siblings = set([root_workpackage])
+            siblings.add(root_workpackage)
+            workpackages.difference_update(siblings)
+            groups.append((root_workpackage.id,
+                           sorted(workpackage.id for workpackage in siblings)))
+        return groups
+
+    def _analyse_groups(self, stepname, groups, patternset):
+        """Analyse the given workpackage groups of a step and return a dict
+        root workpackage id -> result dict and the file index entries of
+        all scanned files"""
+        self._used_file_index = dict()
+        LOGGER.debug("  analyse step \"{0}\"".format(stepname))
+        workpackages = dict((workpackage.id, workpackage) for workpackage in
+                            self._benchmark.workpackages[stepname])
+        group_results = dict()
+        for root_id, workpackage_ids in groups:
+            group_results[root_id] = self._analyse_group(
+                self._benchmark.steps[stepname], workpackages[root_id],
+                [workpackages[wp_id] for wp_id in workpackage_ids],
+                patternset)
+        return group_results, self._used_file_index
+
+    def _analyse_group(self, step, root_workpackage, siblings, patternset):
+        """Analyse all files of the given workpackages and return the
+        combined result dict"""
+        match_dict = dict()
+        # Global patternset to store all existing pattern (e.g. from
+        # individual file uses), necessary to evaluate default pattern
+        # and derived pattern
+        global_patternset = patternset.copy()
+        group_result = dict()
+        stepname = step.name
+        for workpackage in siblings:
+            # Ignore workpackages not started yet
+            if not workpackage.started:
+                continue
+
+            parameter = \
+                dict([[par.name, par.value] for par in
+                      workpackage.parameterset.
+                      constant_parameter_dict.values()])
+
+            for file_obj in self._analyse[stepname]:
+                if step.alt_work_dir is not None:
+                    file_path = step.alt_work_dir
+                    file_path = jube2.util.util.substitution(
+                        file_path, parameter)
+                    file_path = \
+                        os.path.expandvars(os.path.expanduser(file_path))
+                    file_path = os.path.join(
+                        self._benchmark.file_path_ref, file_path)
+                else:
+                    file_path = workpackage.work_dir
+
+                filename = \
+                    jube2.util.util.substitution(file_obj.path, parameter)
+                filename = \
+                    os.path.expandvars(os.path.expanduser(filename))
+
+                file_path = os.path.join(file_path, filename)
+                for path in glob.glob(file_path):
+                    # scan files
+                    LOGGER.debug(("    scan file {0}").format(path))
+
+                    new_result_dict, match_dict = \
+                        self._analyse_file(path, patternset,
+                                           global_patternset,
+                                           workpackage.parameterset,
+                                           match_dict,
+                                           file_obj.use,
+                                           file_obj.stream)
+                    group_result.update(new_result_dict)
+
+        # Set default pattern values if available and necessary
+        new_result_dict = group_result
+        for pattern in global_patternset.pattern_storage:
+            if (pattern.default_value is not None) and \
+                    (pattern.name not in new_result_dict):
+                default = pattern.default_value
+                # Convert default value
+                if pattern.content_type == "int":
+                    if default == "nan":
+                        default = float("nan")
+                    else:
+                        default = int(float(default))
+                elif pattern.content_type == "float":
+                    default = float(default)
+                new_result_dict[pattern.name] = default
+                new_result_dict[pattern.name + "_cnt"] = 0
+                new_result_dict[pattern.name + "_first"] = default
+                new_result_dict[pattern.name + "_last"] = default
+                if pattern.content_type in ["int", "float"]:
+                    new_result_dict.update(
+                        {pattern.name + "_sum": default,
+                         pattern.name + "_min": default,
+                         pattern.name + "_max": default,
+                         pattern.name + "_avg": default,
+                         pattern.name + "_sum2": default ** 2,
+                         pattern.name + "_std": 0})
+                    for percentile in jube2.conf.PATTERN_PERCENTILES:
+                        new_result_dict["{0}_p{1}".format(
+                            pattern.name, percentile)] = default
+
+        # Evaluate derived pattern
+        new_result_dict = self._eval_derived_pattern(
+            global_patternset, root_workpackage.parameterset, group_result)
+        group_result.update(new_result_dict)
+
+        return group_result
 
     def _eval_derived_pattern(self, patternset, parameterset, result_dict):
         """Evaluate all derived pattern in patternset using parameterset
@@ -334,9 +635,11 @@ class Analyser(object):
         return new_result_dict
 
     def _analyse_file(self, file_path, patternset, global_patternset,
-                      parameterset, match_dict=None, additional_uses=None):
+                      parameterset, match_dict=None, additional_uses=None,
+                      stream=False):
         """Scan given files with given pattern and produce a result
-        parameterset"""
+        parameterset. In stream mode the file content is not read as a
+        whole."""
         if additional_uses is None:
             additional_uses = set()
         if match_dict is None:
@@ -375,123 +678,75 @@ class Analyser(object):
 
         patternlist = [p for p in local_patternset.pattern_storage]
 
-        file_handle = open(file_path, "r")
-        # Read file content
-        data = file_handle.read()
+        regex_list = list()
         for pattern in patternlist:
-            if pattern.name not in match_dict:
-                match_dict[pattern.name] = dict()
             try:
                 mode = re.MULTILINE
                 if pattern.dotall:
                     mode += re.DOTALL
-                regex = re.compile(pattern.value, mode)
+                regex_list.append(_compile_regex(pattern.value, mode))
             except re.error as ree:
                 raise RuntimeError(("Error inside pattern \"{0}\" : " +
                                     "\"{1}\" : {2}")
                                    .format(pattern.name, pattern.value, ree))
-            # Run regular expression
-            matches = re.findall(regex, data)
-            # If there are different groups reduce result shape
-            if regex.groups > 1:
-                match_list = list()
-                for match in matches:
-                    match_list = match_list + list(match)
-            else:
-                match_list = matches
-            # Remove empty matches
-            match_list = [match for match in match_list if match != ""]
-
-            # Convert to pattern type
-            new_match_list = list()
-            for match in match_list:
-                try:
-                    if pattern.content_type == "int":
-                        if match == "nan":
-                            new_match_list.append(float("nan"))
-                        else:
-                            new_match_list.append(int(float(match)))
-                    elif pattern.content_type == "float":
-                        new_match_list.append(float(match))
-                    else:
-                        new_match_list.append(match)
-                except ValueError:
-                    LOGGER.warning(("\"{0}\" cannot be represented " +
-                                    "as a \"{1}\"")
-                                   .format(match, pattern.content_type))
-            match_list = new_match_list
-
-            if len(match_list) > 0:
-                # First match is default
-                if "first" not in match_dict[pattern.name]:
-                    match_dict[pattern.name]["first"] = match_list[0]
-
-                for match in match_list:
-                    if pattern.content_type in ["int", "float"]:
-                        if "min" in match_dict[pattern.name]:
-                            match_dict[pattern.name]["min"] = \
-                                min(match_dict[pattern.name]["min"], match)
-                        else:
-                            match_dict[pattern.name]["min"] = match
-                        if "max" in match_dict[pattern.name]:
-                            match_dict[pattern.name]["max"] = \
-                                max(match_dict[pattern.name]["max"], match)
-                        else:
-                            match_dict[pattern.name]["max"] = match
-                        if "sum" in match_dict[pattern.name]:
-                            match_dict[pattern.name]["sum"] += match
-                        else:
-                            match_dict[pattern.name]["sum"] = match
-                        try:
-                            if "sum2" in match_dict[pattern.name]:
-                                match_dict[pattern.name]["sum2"] += match ** 2
-                            else:
-                                match_dict[pattern.name]["sum2"] = match ** 2
-                        except OverflowError:
-                            LOGGER.warning(
-                                "Squared sum cannot be represented, " +
-                                "numerical result out of range.")
-                            match_dict[pattern.name]["sum2"] = math.nan
-
-                    if "cnt" in match_dict[pattern.name]:
-                        match_dict[pattern.name]["cnt"] += 1
-                    else:
-                        match_dict[pattern.name]["cnt"] = 1
-
-                if pattern.content_type in ["int", "float"]:
-                    if match_dict[pattern.name]["cnt"] > 0:
-                        match_dict[pattern.name]["avg"] = \
-                            (match_dict[pattern.name]["sum"] /
-                             match_dict[pattern.name]["cnt"])
-
-                    if match_dict[pattern.name]["cnt"] > 1:
-                        try:
-                            match_dict[pattern.name]["std"] = math.sqrt(
-                                (abs(match_dict[pattern.name]["sum2"] -
-                                     (match_dict[pattern.name]["sum"] ** 2 /
-                                      match_dict[pattern.name]["cnt"])) /
-                                 (match_dict[pattern.name]["cnt"] - 1)))
-                        except OverflowError:
-                            match_dict[pattern.name]["std"] = 0
-                    else:
-                        match_dict[pattern.name]["std"] = 0
 
-                match_dict[pattern.name]["last"] = match_list[-1]
+        # Reuse the matches of a previous analyse if neither the file nor
+        # the pattern were changed
+        pattern_hash = hashlib.sha1(repr(
+            [(pattern.name, pattern.value, pattern.dotall,
+              pattern.content_type) for pattern in patternlist] +
+            [stream]).encode("utf-8")).hexdigest()
+        index_key = (os.path.abspath(file_path), pattern_hash)
+        file_stat = os.stat(file_path)
+        fingerprint = (file_stat.st_size, file_stat.st_mtime_ns)
+        if (index_key in self._file_index) and \
+                (tuple(self._file_index[index_key][:2]) == fingerprint):
+            LOGGER.debug("      file \"{0}\" unchanged, reuse matches"
+                         .format(os.path.basename(file_path)))
+            file_match_dict = self._file_index[index_key][2]
+        else:
+            file_match_dict = dict()
+            for pattern in patternlist:
+                file_match_dict[pattern.name] = dict()
+
+            if stream:
+                self._scan_file_stream(file_path, patternlist, regex_list,
+                                       file_match_dict)
+            else:
+                file_handle = open(file_path, "r")
+                # Read file content
+                data = file_handle.read()
+                file_handle.close()
+                # Run regular expressions
+                all_matches = _scan_data(data, regex_list)
+                for pattern, (regex, _), matches in zip(patternlist,
+                                                        regex_list,
+                                                        all_matches):
+                    self._add_matches(pattern, regex, matches,
+                                      file_match_dict)
+        self._used_file_index[index_key] = fingerprint + (file_match_dict,)
+        self._merge_match_dict(match_dict, file_match_dict)
+        # Percentiles are only calculated once all matches were added
+        for values in match_dict.values():
+            if "sketch" in values:
+                values.update(_percentiles(values))
 
         info_str = "      file \"{0}\" scanned pattern found:\n".format(
             os.path.basename(file_path))
         info_str += jube2.util.output.text_table(
             [(_name, ", ".join(["{0}:{1}".format(key, con)
-                                for key, con in value.items()]))
+                                for key, con in value.items()
+                                if key not in _INTERNAL_VALUES]))
              for _name, value in match_dict.items()],
             indent=9, align_right=True, auto_linebreak=True)
         LOGGER.debug(info_str)
-        file_handle.close()
 
         # Create result dict
         result_dict = dict()
         for pattern_name in match_dict:
             for option in match_dict[pattern_name]:
+                if option in _INTERNAL_VALUES:
+                    continue
                 if option == "first":
                     result_dict[pattern_name] = \
                         match_dict[pattern_name][option]
@@ -500,6 +755,155 @@ class Analyser(object):
 
         return result_dict, match_dict
 
+    def _scan_file_stream(self, file_path, patternlist, regex_list,
+                          match_dict):
+        """Scan file without reading its whole content. Line local pattern
+        are used on blocks of complete lines, all other pattern are used on
+        a memory mapped bytes representation of the file."""
+        line_local = [i for i, (regex, local) in enumerate(regex_list)
+                      if local]
+        multi_line = [i for i, (regex, local) in enumerate(regex_list)
+                      if not local]
+
+        if len(line_local) > 0:
+            local_regex_list = [regex_list[i] for i in line_local]
+            with open(file_path, "r") as file_handle:
+                while True:
+                    lines = file_handle.readlines(
+                        jube2.conf.ANALYSE_STREAM_CHUNK_SIZE)
+                    if len(lines) == 0:
+                        break
+                    all_matches = _scan_data("".join(lines), local_regex_list)
+                    for i, matches in zip(line_local, all_matches):
+                        self._add_matches(patternlist[i], regex_list[i][0],
+                                          matches, match_dict)
+
+        if len(multi_line) > 0:
+            encoding = locale.getpreferredencoding(False)
+            with open(file_path, "rb") as file_handle:
+                if os.fstat(file_handle.fileno()).st_size > 0:
+                    data = mmap.mmap(file_handle.fileno(), 0,
+                                     access=mmap.ACCESS_READ)
+                else:
+                    data = bytes()
+                try:
+                    for i in multi_line:
+                        pattern = patternlist[i]
+                        regex = regex_list[i][0]
+                        try:
+                            bytes_regex = re.compile(
+                                regex.pattern.encode(encoding),
+                                regex.flags & ~re.UNICODE)
+                        except (re.error, UnicodeError) as error:
+                            raise RuntimeError(
+                                ("Error inside pattern \"{0}\" : " +
+                                 "\"{1}\" : {2}").format(
+                                     pattern.name, pattern.value, error))
+                        matches = bytes_regex.findall(data)
+                        if bytes_regex.groups > 1:
+                            matches = [tuple(group.decode(encoding, "replace")
+                                             for group in match)
+                                       for match in matches]
+                        else:
+                            matches = [match.decode(encoding, "replace")
+                                       for match in matches]
+                        self._add_matches(pattern, regex, matches,
+                                          match_dict)
+                finally:
+                    if isinstance(data, mmap.mmap):
+                        data.close()
+
+    @staticmethod
+    def _add_matches(pattern, regex, matches, match_dict):
+        """Update the aggregated values of pattern inside match_dict using
+        the given findall result"""
+        # If there are different groups reduce result shape
+        if regex.groups > 1:
+            match_list = [group for match in matches for group in match]
+        else:
+            match_list = matches
+        # Remove empty matches
+        match_list = [match for match in match_list if match != ""]
+
+        # Convert to pattern type
+        new_match_list = list()
+        for match in match_list:
+            try:
+                if pattern.content_type == "int":
+                    if match == "nan":
+                        new_match_list.append(float("nan"))
+                    else:
+                        new_match_list.append(int(float(match)))
+                elif pattern.content_type == "float":
+                    new_match_list.append(float(match))
+                else:
+                    new_match_list.append(match)
+            except ValueError:
+                LOGGER.warning(("\"{0}\" cannot be represented " +
+                                "as a \"{1}\"")
+                               .format(match, pattern.content_type))
+        match_list = new_match_list
+
+        if len(match_list) > 0:
+            values = {"first": match_list[0],
+                      "last": match_list[-1],
+                      "cnt": len(match_list)}
+            if pattern.content_type in ["int", "float"]:
+                values.update(_statistics(match_list))
+            Analyser._merge_values(match_dict[pattern.name], values)
+
+    @staticmethod
+    def _merge_values(old_values, values):
+        """Add the aggregated values of a block of matches of a single
+        pattern to old_values"""
+        if "cnt" not in old_values:
+            old_values.update(values)
+        else:
+            cnt = old_values["cnt"] + values["cnt"]
+            if "sum" in values:
+                # Combine sum of squared deviations (Chan et al.)
+                delta = values["avg"] - old_values["avg"]
+                try:
+                    old_values["m2"] += values["m2"] + delta * delta * \
+                        old_values["cnt"] * values["cnt"] / cnt
+                except OverflowError:
+                    old_values["m2"] = math.nan
+                old_values["min"] = min(old_values["min"], values["min"])
+                old_values["max"] = max(old_values["max"], values["max"])
+                old_values["sum"] += values["sum"]
+                old_values["sum2"] += values["sum2"]
+                if ("sketch" not in old_values) or \
+                        ("sketch" not in values):
+                    old_values.pop("sketch", None)
+                elif (old_values["sketch"] is None) or \
+                        (values["sketch"] is None):
+                    old_values["sketch"] = None
+                else:
+                    old_values["sketch"] = _compress_sketch(
+                        old_values["sketch"] + values["sketch"])
+            old_values["cnt"] = cnt
+            old_values["last"] = values["last"]
+
+        if "sum" in old_values:
+            try:
+                old_values["avg"] = old_values["sum"] / old_values["cnt"]
+            except OverflowError:
+                old_values["avg"] = math.nan
+            if old_values["cnt"] > 1:
+                old_values["std"] = \
+                    math.sqrt(old_values["m2"] / (old_values["cnt"] - 1))
+            else:
+                old_values["std"] = 0
+
+    @staticmethod
+    def _merge_match_dict(match_dict, file_match_dict):
+        """Add the aggregated values of a single file to match_dict"""
+        for name, values in file_match_dict.items():
+            if name not in match_dict:
+                match_dict[name] = dict()
+            if "cnt" in values:
+                Analyser._merge_values(match_dict[name], values)
+
     def analyse_etree_repr(self):
         """Create an etree representation of a analyse dict:
         stepname -> workpackage_id -> filename -> patternname -> value
@@ -530,3 +934,113 @@ class Analyser(object):
                             [pattern])
             etree.append(step_etree)
         return etree
+
+
+class AnalyseResultStore(Mapping):
+
+    """Read only analyse result of a single analyser, which is loaded out of
+    the analyse database (stepname -> workpackage_id -> patternname ->
+    value). The data of a step is only loaded when it is accessed."""
+
+    def __init__(self, filename, analyser_name):
+        self._filename = filename
+        self._analyser_name = analyser_name
+        self._stepnames = None
+        self._steps = dict()
+
+    def _query(self, sql, parameters):
+        """Run a single query using the analyse database"""
+        con = sqlite3.connect(self._filename)
+        try:
+            return con.execute(sql, parameters).fetchall()
+        finally:
+            con.close()
+
+    def _load_stepnames(self):
+        """Load names of all analysed steps"""
+        if self._stepnames is None:
+            self._stepnames = [row[0] for row in self._query(
+                "SELECT step FROM analyse WHERE analyser = ? AND " +
+                "step IS NOT NULL GROUP BY step ORDER BY MIN(rowid)",
+                (self._analyser_name,))]
+        return self._stepnames
+
+    def __getitem__(self, stepname):
+        if stepname not in self._steps:
+            if stepname not in self._load_stepnames():
+                raise KeyError(stepname)
+            step_result = dict()
+            for wp_id, pattern_name, content_type, value in self._query(
+                    "SELECT workpackage, pattern, type, value FROM analyse " +
+                    "WHERE analyser = ? AND step = ? ORDER BY rowid",
+                    (self._analyser_name, stepname)):
+                if wp_id not in step_result:
+                    step_result[wp_id] = dict()
+                if pattern_name is not None:
+                    step_result[wp_id][pattern_name] = \
+                        jube2.util.util.convert_type(content_type, value)
+            self._steps[stepname] = step_result
+        return self._steps[stepname]
+
+    def __iter__(self):
+        return iter(self._load_stepnames())
+
+    def __len__(self):
+        return len(self._load_stepnames())
+
+    @staticmethod
+    def write(filename, analysers):
+        """Write the analyse results of all given analysers to the analyse
+        database given by filename"""
+        rows = list()
+        for analyser in analysers:
+            # Each analyser is marked by a row without step name
+            rows.append((analyser.name, None, None, None, None, None))
+            if analyser.analyse_result is None:
+                continue
+            for stepname, step_result in analyser.analyse_result.items():
+                for wp_id, wp_result in step_result.items():
+                    # A workpackage without any pattern is stored by a
+                    # single row without pattern name
+                    if len(wp_result) == 0:
+                        rows.append((analyser.name, stepname, wp_id, None,
+                                     None, None))
+                    for pattern_name, value in wp_result.items():
+                        if type(value) is int:
+                            content_type = "int"
+                        elif type(value) is float:
+                            content_type = "float"
+                        else:
+                            content_type = "string"
+                        rows.append((analyser.name, stepname, wp_id,
+                                     pattern_name, content_type, str(value)))
+        # Replace the database as a whole, to never leave a partial result
+        tmp_filename = filename + ".tmp"
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        con = sqlite3.connect(tmp_filename)
+        try:
+            con.execute("CREATE TABLE analyse (analyser TEXT, step TEXT, " +
+                        "workpackage INTEGER, pattern TEXT, type TEXT, " +
+                        "value TEXT)")
+            con.executemany("INSERT INTO analyse VALUES (?, ?, ?, ?, ?, ?)",
+                            rows)
+            con.execute("CREATE INDEX analyse_step ON analyse " +
+                        "(analyser, step)")
+            con.commit()
+        finally:
+            con.close()
+        os.replace(tmp_filename, filename)
+
+    @staticmethod
+    def read(filename):
+        """Return dict analyser name -> AnalyseResultStore of all analysers
+        stored inside the analyse database given by filename"""
+        con = sqlite3.connect(filename)
+        try:
+            analyser_names = [row[0] for row in con.execute(
+                "SELECT DISTINCT analyser FROM analyse")]
+        finally:
+            con.close()
+        return dict((name, AnalyseResultStore(filename, name))
+                    for name in analyser_names)
@@ -21,7 +21,6 @@ from __future__ import (print_function,
                         unicode_literals,
                         division)
 
-import multiprocessing as mp
 import xml.etree.ElementTree as ET
 import xml.dom.minidom as DOM
 import logging
@@ -31,7 +30,10 @@ import stat
 import pprint
 import shutil
 import itertools
+import time
+import json
 import jube2.parameter
+import jube2.analyser
 import jube2.util.util
 import jube2.util.output
 import jube2.conf
@@ -62,7 +64,13 @@ class Benchmark(object):
         for result in self._results.values():
             result.benchmark = self
         self._workpackages = dict()
+        self._workpackage_index = dict()
+        self._ancestors = dict()
+        self._descendants = dict()
         self._work_stat = jube2.util.util.WorkStat()
+        self._changed_workpackages = list()
+        self._journal_id = None
+        self._journal_entries = 0
         self._comment = comment
         self._id = -1
         self._file_path_ref = file_path_ref
@@ -151,12 +159,45 @@ class Benchmark(object):
             self._tags = self._tags.union(set(other_tags))
 
     def workpackage_by_id(self, wp_id):
-        """Search and return a benchmark workpackage by its wp_id"""
-        for stepname in self._workpackages:
-            for workpackage in self._workpackages[stepname]:
-                if workpackage.id == wp_id:
-                    return workpackage
-        return None
+        """Return a benchmark workpackage by its wp_id"""
+        return self._workpackage_index.get(wp_id)
+
+    def _add_workpackages(self, stepname, workpackages):
+        """Add new workpackages of the given step to the benchmark"""
+        self._workpackages[stepname] += workpackages
+        for workpackage in workpackages:
+            self._workpackage_index[workpackage.id] = workpackage
+        self.invalidate_workpackage_graph()
+
+    def invalidate_workpackage_graph(self):
+        """Forget all cached ancestors and descendants, must be called
+        whenever workpackages or their dependencies were changed"""
+        self._ancestors = dict()
+        self._descendants = dict()
+
+    def workpackage_ancestors(self, workpackage):
+        """Return list of all direct and indirect parents of workpackage.
+        Each workpackage is only listed once, after all of its own
+        parents."""
+        if workpackage not in self._ancestors:
+            ancestors = list()
+            for parent in workpackage.parents:
+                ancestors += self.workpackage_ancestors(parent)
+            ancestors += workpackage.parents
+            self._ancestors[workpackage] = \
+                jube2.util.util.unique_list(ancestors)
+        return self._ancestors[workpackage]
+
+    def workpackage_descendants(self, workpackage):
+        """Return list of all direct and indirect children of workpackage.
+        Each workpackage is only listed once."""
+        if workpackage not in self._descendants:
+            descendants = list(workpackage.children)
+            for child in workpackage.children:
+                descendants += self.workpackage_descendants(child)
+            self._descendants[workpackage] = \
+                jube2.util.util.unique_list(descendants)
+        return self._descendants[workpackage]
 
     def remove_workpackage(self, workpackage_to_delete):
         """Remove a specifc workpackage"""
@@ -164,6 +205,14 @@ class Benchmark(object):
         if stepname in self._workpackages and \
                 workpackage_to_delete in self._workpackages[stepname]:
             self._workpackages[stepname].remove(workpackage_to_delete)
+            del self._workpackage_index[workpackage_to_delete.id]
+            self.invalidate_workpackage_graph()
+
+    def refresh_workpackage_states(self):
+        """Reload the state of all workpackages from their marker files"""
+        jube2.workpackage.Workpackage.refresh_states(
+            [workpackage for workpackages in self._workpackages.values()
+             for workpackage in workpackages])
 
     @property
     def work_stat(self):
@@ -328,6 +377,8 @@ class Benchmark(object):
         """Create initial workpackages of current benchmark and create graph
         structure."""
         self._workpackages = dict()
+        self._workpackage_index = dict()
+        self.invalidate_workpackage_graph()
         self._work_stat = jube2.util.util.WorkStat()
 
         # Create workpackage storage
@@ -339,37 +390,68 @@ class Benchmark(object):
             if len(step.depend) == 0:
                 new_workpackages = \
                     self._create_new_workpackages_with_parents(step)
-                self._workpackages[step.name] += new_workpackages
+                self._add_workpackages(step.name, new_workpackages)
                 for workpackage in new_workpackages:
                     workpackage.queued = True
                     self._work_stat.put(workpackage)
 
-    def analyse(self, show_info=True, specific_analyser_name=None):
-        """Run analyser"""
+    def analyse(self, show_info=True, specific_analyser_name=None,
+                procs=None):
+        """Run analyser
+
+        procs: number of worker processes used to analyse the workpackages
+        of each analyser (default: 1)
+        """
 
         if show_info:
             LOGGER.info(">>> Start analyse")
 
+        if procs is None:
+            procs = 1
+        self.read_analyse_index(os.path.join(
+            self.bench_dir, jube2.conf.ANALYSE_INDEX_FILENAME))
         if specific_analyser_name is not None and \
                 specific_analyser_name in self._analyser:
-            self._analyser[specific_analyser_name].analyse()
+            self._analyser[specific_analyser_name].analyse(procs)
         else:
             for analyser in self._analyser.values():
-                analyser.analyse()
+                analyser.analyse(procs)
         if ((not jube2.conf.DEBUG_MODE) and
                 (os.access(self.bench_dir, os.W_OK))):
             self.write_analyse_data(os.path.join(self.bench_dir,
                                                  jube2.conf.ANALYSE_FILENAME))
+            # The database must not be older than the xml export
+            jube2.analyser.AnalyseResultStore.write(
+                os.path.join(self.bench_dir, jube2.conf.ANALYSE_DB_FILENAME),
+                self._analyser.values())
+            self.write_analyse_index(os.path.join(
+                self.bench_dir, jube2.conf.ANALYSE_INDEX_FILENAME))
         if show_info:
             LOGGER.info(">>> Analyse finished")
 
     def create_result(self, only=None, show=False, data_list=None, style=None,
                       select=None, exclude=None):
         """Show benchmark result"""
-        if only is None:
-            only = [result_name for result_name in self._results]
         if data_list is None:
             data_list = list()
+        for result_data, filename in self.create_result_data(
+                only, style, select, exclude):
+            result_data.create_result(show=show, filename=filename)
+
+            if result_data in data_list:
+                data_list[data_list.index(result_data)].add_result_data(
+                    result_data)
+            else:
+                data_list.append(result_data)
+        return data_list
+
+    def create_result_data(self, only=None, style=None, select=None,
+                           exclude=None):
+        """Return list of (result data, result filename) tuples of all
+        results. filename is None if the result cannot be stored."""
+        if only is None:
+            only = [result_name for result_name in self._results]
+        result_data_list = list()
         for result_name in self._results_order:
             result = self._results[result_name]
             if result.name in only:
@@ -396,14 +478,8 @@ class Benchmark(object):
                                             "{0}.dat".format(result.name))
                 else:
                     filename = None
-                result_data.create_result(show=show, filename=filename)
-
-                if result_data in data_list:
-                    data_list[data_list.index(result_data)].add_result_data(
-                        result_data)
-                else:
-                    data_list.append(result_data)
-        return data_list
+                result_data_list.append((result_data, filename))
+        return result_data_list
 
     def update_analyse_and_result(self, new_patternsets, new_analyser,
                                   new_results, new_results_order, new_cwd):
@@ -453,6 +529,35 @@ class Benchmark(object):
         fout.write(dom.toprettyxml(indent="  ", encoding="UTF-8"))
         fout.close()
 
+    def read_analyse_index(self, filename):
+        """Load the file indices of all analysers out of given file, to
+        skip unchanged files when running analyse again"""
+        if not os.path.isfile(filename):
+            return
+        try:
+            with open(filename, "r") as index_file:
+                index = json.load(index_file)
+        except (IOError, ValueError) as error:
+            LOGGER.warning("Cannot read analyse index \"{0}\": {1}"
+                           .format(filename, error))
+            return
+        for analyser_name, entries in index.items():
+            if analyser_name in self._analyser:
+                self._analyser[analyser_name].file_index = dict(
+                    ((path, pattern_hash), (size, mtime, match_dict))
+                    for path, pattern_hash, size, mtime, match_dict
+                    in entries)
+
+    def write_analyse_index(self, filename):
+        """The file indices of all analysers will be written to given file
+        using json representation"""
+        index = dict()
+        for analyser_name, analyser in self._analyser.items():
+            index[analyser_name] = [list(key) + list(entry) for key, entry
+                                    in analyser.file_index.items()]
+        with open(filename, "w") as index_file:
+            json.dump(index, index_file)
+
     def _create_new_workpackages_for_workpackage(self, workpackage):
         """Create and return new workpackages if given workpackage
         was finished."""
@@ -492,7 +597,7 @@ class Benchmark(object):
                     for parent in workpackage_combination:
                         parent.add_children(new_workpackage)
 
-                self._workpackages[dependent_step.name] += new_workpackages
+                self._add_workpackages(dependent_step.name, new_workpackages)
                 all_new_workpackages += new_workpackages
             if possible_combination > 0:
                 LOGGER.debug(("  {0} workpackages combinations were skipped"
@@ -558,7 +663,7 @@ class Benchmark(object):
 
         return new_workpackages
 
-    def new_run(self):
+    def new_run(self, procs=None):
         """Create workpackage structure and run benchmark"""
         # Check benchmark consistency
         LOGGER.debug("Start consistency check")
@@ -593,10 +698,18 @@ class Benchmark(object):
 
         LOGGER.debug("Start benchmark run")
 
-        self.run()
+        self.run(procs)
+
+    def run(self, procs=None):
+        """Run benchmark
 
-    def run(self):
-        """Run benchmark"""
+        procs: number of workpackages which can run at the same time. By
+        default the largest procs value of all steps is used and only
+        steps with procs > 1 are executed by worker processes. If procs is
+        given, workpackages of all steps without shared operations are
+        executed by worker processes, each step limited by its own procs.
+        """
+        use_all_steps = procs is not None
         title = "benchmark: {0}".format(self._name)
         title += "\nid: {0}".format(self._id)
         if jube2.conf.DEBUG_MODE:
@@ -605,97 +718,77 @@ class Benchmark(object):
         infostr = jube2.util.output.text_boxed(title)
         LOGGER.info(infostr)
 
+        # Workpackage states can be changed outside of this run
+        self.refresh_workpackage_states()
+
         if not jube2.conf.HIDE_ANIMATIONS:
             print("\nRunning workpackages (#=done, 0=wait, E=error):")
             status = self.benchmark_status
             jube2.util.output.print_loading_bar(
                 status["done"], status["all"], status["wait"], status["error"])
 
-        # Handle all workpackages in given order
-        while not self._work_stat.empty():
-            workpackage = self._work_stat.get()
-
-            run_parallel = False
-
-            def collect_result(val):
-                """used collect return values from pool.apply_async"""
-                # run postprocessing of each wp
-                for i, wp in enumerate(self._workpackages[val["step_name"]]):
-                    if wp.id == val["id"]:
-                        if(len(val) == 2):  # workpackage is done or its execution was erroneous
-                            pass
-                        else:
-                            # update corresponding wp in self._workpackage with modified wp
-                            wp.env = val["env"]
-                            # restore the parameters containing a method of a class,
-                            # which needed to be deleted within the multiprocess
-                            # execution to avoid excessive memory usage
-                            for p in wp._parameterset.all_parameters:
-                                if(p.search_method(propertyString="eval_helper",
-                                                   recursiveProperty="based_on")):
-                                    val["parameterset"].add_parameter(p)
-                            wp.parameterset = val["parameterset"]
-                            wp.cycle = val["cycle"]
-                        self.wp_post_run_config(wp)
-                        break
-
-            def log_e(e):
-                """used to print error_callback from pool.apply_async"""
-                print(e)
-            # TODO
-            # writeXML position(y) - replace by database
-            # TODO END
-            if not workpackage.done:
-                # execute wps in parallel which have the same name
-                if workpackage.step.procs > 1:
-                    run_parallel = True
-                    procs = workpackage.step.procs
-                    name = workpackage.step.name
-                    pool = mp.Pool(processes=procs)
-
-                    # add wps to the parallel pool as long as they have the same name
-                    while True:
-                        pool.apply_async(workpackage.run, args=('p',),
-                                         callback=collect_result, error_callback=log_e)
-
-                        if not self._work_stat.empty():
-                            workpackage = self._work_stat.get()
-                            # push back as first element of _work_stat and
-                            # terminate parallel loop
-                            if workpackage.step.name != name:
-                                self._work_stat.push_back(workpackage)
-                                break
-                        else:
-                            break
-
-                    pool.close()
-                    pool.join()
-                else:
-                    workpackage.run()
-
-            if run_parallel == True:
-                # merge parallel run log files into the main run log file and
-                # delete the parallel logs
-                log_fname = jube2.log.LOGFILE_NAME.split('/')[-1]
-                filenames = [file for file in os.listdir(self.bench_dir)
-                             if file.startswith(log_fname.split('.')[0]) and
-                             file != log_fname]
-                filenames.sort(key=lambda o: int(re.split('_|\.', o)[1]))
-                with open(os.path.join(self.bench_dir,
-                                       jube2.conf.LOGFILE_RUN_NAME), 'a') as outfile:
-                    for fname in filenames:
-                        with open(os.path.join(self.bench_dir, fname), 'r') as infile:
-                            contents = infile.read()
-                            outfile.write(contents)
-                        os.remove(os.path.join(self.bench_dir, fname))
-
-                run_parallel = False
-            else:
-                self.wp_post_run_config(workpackage)
-
-            # Store workpackage information
-            self.write_workpackage_information(
-                os.path.join(self.bench_dir, jube2.conf.WORKPACKAGES_FILENAME))
+        # Long-living worker pool, shared by all steps. Its size limits the
+        # number of workpackages running at the same time.
+        if procs is None:
+            procs = max([step.procs for step in self._steps.values()] + [1])
+        if procs > 1:
+            worker_pool = jube2.util.util.WorkerPool(procs)
+        else:
+            worker_pool = None
+        workpackage_filename = os.path.join(self.bench_dir,
+                                            jube2.conf.WORKPACKAGES_FILENAME)
+
+        try:
+            # Every queued workpackage is ready to run (all parents are
+            # done). Start them, independent of their step, as long as free
+            # slots are available.
+            while (not self._work_stat.empty()) or \
+                    (worker_pool is not None and worker_pool.running() > 0):
+                blocked = list()
+                while not self._work_stat.empty():
+                    if worker_pool is not None:
+                        for result in worker_pool.poll():
+                            self._collect_parallel_result(result)
+                    workpackage = self._work_stat.get()
+
+                    if workpackage.done:
+                        self.wp_post_run_config(workpackage)
+                    elif not self._use_worker_pool(workpackage, worker_pool,
+                                                   use_all_steps):
+                        workpackage.run()
+                        self.wp_post_run_config(workpackage)
+                    elif worker_pool.has_free_slot(workpackage.step.name,
+                                                   workpackage.step.procs):
+                        worker_pool.submit(workpackage.step.name,
+                                           workpackage.run, ("p",))
+                        continue
+                    else:
+                        blocked.append(workpackage)
+                        continue
+                    # Store workpackage information
+                    self._store_workpackage_changes(workpackage_filename)
+
+                # Blocked workpackages keep their queue position
+                for workpackage in reversed(blocked):
+                    self._work_stat.push_back(workpackage)
+
+                # Wait until the next workpackage is finished
+                if worker_pool is not None and worker_pool.running() > 0:
+                    self._collect_parallel_result(worker_pool.wait())
+                    if worker_pool.running() == 0:
+                        self._merge_parallel_logs()
+                    # Store workpackage information
+                    self._store_workpackage_changes(workpackage_filename)
+        except BaseException:
+            if worker_pool is not None:
+                worker_pool.terminate()
+            raise
+        if worker_pool is not None:
+            worker_pool.close()
+
+        # Compact workpackage journal
+        if self._journal_entries > 0:
+            self.write_workpackage_information(workpackage_filename)
 
         print("\n")
         status_data = [("stepname", "all", "open", "wait", "error", "done")]
@@ -727,12 +820,78 @@ class Benchmark(object):
                      "--id {1}").format(self._outpath, self._id))
         LOGGER.info(jube2.util.output.text_line() + "\n")
 
+    @staticmethod
+    def _use_worker_pool(workpackage, worker_pool, use_all_steps):
+        """Check if workpackage should be executed by a worker process"""
+        if worker_pool is None:
+            return False
+        if workpackage.step.procs > 1:
+            return True
+        # Shared operations need the workpackage states of the main process
+        return use_all_steps and \
+            not any(operation.shared
+                    for operation in workpackage.step.operations)
+
+    def _collect_parallel_result(self, result):
+        """Postprocess a workpackage which was executed inside of the
+        worker pool"""
+        step_name, val, error = result
+        if error is not None:
+            LOGGER.error(str(error))
+            # The failed workpackage is unknown, its state must be reloaded
+            jube2.workpackage.Workpackage.refresh_states(
+                self._workpackages[step_name])
+            return
+        for wp in self._workpackages[step_name]:
+            if wp.id == val["id"]:
+                # marker files were written by the worker process
+                wp.refresh_state()
+                # workpackage is done or its execution was erroneous
+                if len(val) > 2:
+                    # update corresponding wp in self._workpackage with
+                    # modified wp
+                    wp.env = val["env"]
+                    # restore the parameters containing a method of a class,
+                    # which needed to be deleted within the multiprocess
+                    # execution to avoid excessive memory usage
+                    for p in wp.parameterset.all_parameters:
+                        if p.search_method(propertyString="eval_helper",
+                                           recursiveProperty="based_on"):
+                            val["parameterset"].add_parameter(p)
+                    wp.parameterset = val["parameterset"]
+                    wp.cycle = val["cycle"]
+                self.wp_post_run_config(wp)
+                break
+
+    def _merge_parallel_logs(self):
+        """Merge the log files of the worker processes into the main run log
+        file and delete the worker logs"""
+        log_fname = jube2.log.LOGFILE_NAME.split('/')[-1]
+        filenames = [file for file in os.listdir(self.bench_dir)
+                     if file.startswith(log_fname.split('.')[0]) and
+                     file != log_fname]
+        filenames.sort(key=lambda o: int(re.split(r'_|\.', o)[1]))
+        with open(os.path.join(self.bench_dir,
+                               jube2.conf.LOGFILE_RUN_NAME), 'a') as outfile:
+            for fname in filenames:
+                with open(os.path.join(self.bench_dir, fname), 'r') as infile:
+                    outfile.write(infile.read())
+                os.remove(os.path.join(self.bench_dir, fname))
+
     def wp_post_run_config(self, workpackage):
         """additional processing of workpackage:
         - update status bar
         - build up queue after restart
         """
-        self._create_new_workpackages_for_workpackage(workpackage)
+        new_workpackages = \
+            self._create_new_workpackages_for_workpackage(workpackage)
+
+        # Remember changed workpackages for the workpackage journal, new
+        # workpackages can also change their iteration siblings
+        self._changed_workpackages.append(workpackage)
+        for new_workpackage in new_workpackages:
+            self._changed_workpackages.append(new_workpackage)
+            self._changed_workpackages += new_workpackage.iteration_siblings
 
         # Update queues (move waiting workpackages to work queue
         # if possible)
@@ -822,9 +981,15 @@ class Benchmark(object):
 
     def write_workpackage_information(self, filename):
         """All workpackage information will be written to given file
-        using xml representation"""
+        using xml representation. This also compacts the workpackage
+        journal."""
+        # Journal entries are only valid for the snapshot they belong to
+        self._journal_id = "{0:.6f}".format(time.time())
+        self._journal_entries = 0
+        self._changed_workpackages = list()
         # Create root-tag and append workpackages
         workpackages_etree = ET.Element("workpackages")
+        workpackages_etree.attrib["journal"] = self._journal_id
         for workpackages in self._workpackages.values():
             for workpackage in workpackages:
                 workpackages_etree.append(workpackage.etree_repr())
@@ -835,10 +1000,61 @@ class Benchmark(object):
         fout = open(filename, "wb")
         fout.write(dom.toprettyxml(indent="  ", encoding="UTF-8"))
         fout.close()
+        journal_filename = os.path.join(
+            os.path.dirname(filename),
+            jube2.conf.WORKPACKAGES_JOURNAL_FILENAME)
+        if os.path.exists(journal_filename):
+            os.remove(journal_filename)
+
+    def update_workpackage_information(self, filename, workpackages):
+        """Append the current state of the given workpackages to the
+        workpackage journal next to the given workpackage file. The journal
+        is compacted into the workpackage file once it contains more entries
+        than workpackages exist."""
+        all_workpackages = sum(len(workpackages_list) for workpackages_list
+                               in self._workpackages.values())
+        if (self._journal_id is None) or \
+                (self._journal_entries + len(workpackages) >
+                 max(jube2.conf.JOURNAL_COMPACTION_MIN_ENTRIES,
+                     all_workpackages)):
+            self.write_workpackage_information(filename)
+            return
+        # One entry per line, line breaks inside of the xml data are escaped
+        entries = list()
+        for workpackage in workpackages:
+            workpackage_etree = workpackage.etree_repr()
+            workpackage_etree.attrib["journal"] = self._journal_id
+            entries.append(jube2.util.output.element_tree_tostring(
+                workpackage_etree, encoding="UTF-8").replace(
+                    "\n", "&#10;").replace("\r", "&#13;") + "\n")
+        fout = open(os.path.join(os.path.dirname(filename),
+                                 jube2.conf.WORKPACKAGES_JOURNAL_FILENAME),
+                    "ab")
+        fout.write("".join(entries).encode("UTF-8"))
+        fout.close()
+        self._journal_entries += len(workpackages)
+
+    def _store_workpackage_changes(self, filename):
+        """Store all workpackages changed since the last call"""
+        changed_workpackages = list()
+        changed_ids = set()
+        for workpackage in self._changed_workpackages:
+            if workpackage.id not in changed_ids:
+                changed_ids.add(workpackage.id)
+                changed_workpackages.append(workpackage)
+        self._changed_workpackages = list()
+        if len(changed_workpackages) > 0:
+            self.update_workpackage_information(filename,
+                                                changed_workpackages)
 
     def set_workpackage_information(self, workpackages, work_stat):
         """Set new workpackage information"""
         self._workpackages = workpackages
+        self._workpackage_index = dict(
+            (workpackage.id, workpackage)
+            for step_workpackages in workpackages.values()
+            for workpackage in step_workpackages)
+        self.invalidate_workpackage_graph()
         self._work_stat = work_stat
 
     @property
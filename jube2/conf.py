@@ -51,10 +51,15 @@ WORKPACKAGE_ERROR_FILENAME = "error"
 DO_LOG_FILENAME = "do_log"
 CONFIGURATION_FILENAME = "configuration.xml"
 WORKPACKAGES_FILENAME = "workpackages.xml"
+WORKPACKAGES_JOURNAL_FILENAME = "workpackages.journal"
 ANALYSE_FILENAME = "analyse.xml"
+ANALYSE_INDEX_FILENAME = "analyse.index"
+ANALYSE_DB_FILENAME = "analyse.db"
+WAREHOUSE_FILENAME = "warehouse.db"
 RESULT_DIRNAME = "result"
 ENVIRONMENT_INFO = "jube_environment_information.dat"
 TIMESTAMPS_INFO = "timestamps"
+COMPRESSED_FILE_SUFFIX = ".gz"
 
 # logging
 DEFAULT_LOGFILE_NAME = "jube-parse.log"
@@ -72,3 +77,18 @@ DEFAULT_LOGGING_MODE = "default"
 # other
 ERROR_MSG_LINES = 5
 MAX_RECURSIVE_SUB = 5
+JOURNAL_COMPACTION_MIN_ENTRIES = 100
+MAX_REGEX_CACHE_SIZE = 1024
+MAX_SUBSTITUTION_CACHE_SIZE = 4096
+MAX_SCRIPT_RESULT_CACHE_SIZE = 4096
+MAX_PYTHON_CODE_CACHE_SIZE = 4096
+SHELL_COPROCESS = True
+# Shell/perl snippets can depend on time or files, therefore their results
+# are only reused if this is enabled
+SHELL_RESULT_CACHE = False
+ANALYSE_STREAM_CHUNK_SIZE = 1 << 20
+# Percentiles of numeric patterns (e.g. [50, 90, 95, 99]), they are only
+# calculated if they are listed here
+PATTERN_PERCENTILES = []
+PATTERN_PERCENTILE_SKETCH_SIZE = 1000
+RESULT_DATABASE_PRAGMAS = ["journal_mode=WAL", "synchronous=NORMAL"]
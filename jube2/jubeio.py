@@ -436,51 +436,74 @@ class Parser(object):
         return name, comment, tags
 
     def analyse_result_from_xml(self):
-        """Read existing analyse out of xml-file"""
-        LOGGER.debug("Parsing {0}".format(self._filename))
+        """Read existing analyse out of xml-file. The file is read element by
+        element, processed workpackages are dropped from memory."""
+        filename = jube2.util.util.compressed_alternative(self._filename)
+        LOGGER.debug("Parsing {0}".format(filename))
+        analyse_result = dict()
+        # Stack of all open elements
+        elements = list()
+        analyser_name = None
+        step_name = None
         try:
-            tree = ET.parse(self._filename).getroot()
+            with jube2.util.util.open_binary(filename) as xml_file:
+                for event, element in ET.iterparse(xml_file,
+                                                   events=("start", "end")):
+                    if event == "start":
+                        if elements and \
+                                elements[-1].tag in ("analyser", "analyzer"):
+                            Parser._check_tag(element, ["step"])
+                            step_name = Parser._attribute_from_element(
+                                element, "name")
+                            analyse_result[analyser_name][step_name] = \
+                                dict()
+                        elif element.tag in ("analyser", "analyzer"):
+                            analyser_name = Parser._attribute_from_element(
+                                element, "name")
+                            analyse_result[analyser_name] = dict()
+                        elements.append(element)
+                        continue
+                    elements.pop()
+                    if len(elements) > 1 and elements[-1].tag == "step" and \
+                            elements[-2].tag in ("analyser", "analyzer"):
+                        Parser._check_tag(element, ["workpackage"])
+                        wp_id = int(Parser._attribute_from_element(
+                            element, "id"))
+                        analyse_result[analyser_name][step_name][wp_id] = \
+                            Parser._extract_analyse_patterns(element)
+                        # Drop processed patterns
+                        element.clear()
         except ET.ParseError as pe:
             LOGGER.error(
                 "Parsing error while reading existing analysis: " +
                 "{0}".format(pe))
             return None
-        analyse_result = dict()
-        analyser = jube2.util.util.get_tree_elements(tree, "analyzer")
-        analyser += jube2.util.util.get_tree_elements(tree, "analyser")
-        for analyser_etree in analyser:
-            analyser_name = Parser._attribute_from_element(
-                analyser_etree, "name")
-            analyse_result[analyser_name] = dict()
-            for step_etree in analyser_etree:
-                Parser._check_tag(step_etree, ["step"])
-                step_name = Parser._attribute_from_element(
-                    step_etree, "name")
-                analyse_result[analyser_name][step_name] = dict()
-                for workpackage_etree in step_etree:
-                    Parser._check_tag(workpackage_etree, ["workpackage"])
-                    wp_id = int(Parser._attribute_from_element(
-                        workpackage_etree, "id"))
-                    analyse_result[analyser_name][step_name][wp_id] = dict()
-                    for pattern_etree in workpackage_etree:
-                        Parser._check_tag(pattern_etree, ["pattern"])
-                        pattern_name = \
-                            Parser._attribute_from_element(
-                                pattern_etree, "name")
-                        pattern_type = \
-                            Parser._attribute_from_element(
-                                pattern_etree, "type")
-                        value = pattern_etree.text
-                        if value is not None:
-                            value = value.strip()
-                        else:
-                            value = ""
-                        value = jube2.util.util.convert_type(pattern_type,
-                                                             value)
-                        analyse_result[analyser_name][step_name][
-                            wp_id][pattern_name] = value
         return analyse_result
 
+    @staticmethod
+    def _extract_analyse_patterns(workpackage_etree):
+        """Extract analysed pattern values of a workpackage from etree
+
+        Return dict pattern_name => value
+        """
+        patterns = dict()
+        for pattern_etree in workpackage_etree:
+            Parser._check_tag(pattern_etree, ["pattern"])
+            pattern_name = \
+                Parser._attribute_from_element(
+                    pattern_etree, "name")
+            pattern_type = \
+                Parser._attribute_from_element(
+                    pattern_etree, "type")
+            value = pattern_etree.text
+            if value is not None:
+                value = value.strip()
+            else:
+                value = ""
+            patterns[pattern_name] = jube2.util.util.convert_type(
+                pattern_type, value)
+        return patterns
+
     def workpackages_from_xml(self, benchmark):
         """Read existing workpackage data out of a xml-file"""
         workpackages = dict()
@@ -490,37 +513,34 @@ class Parser(object):
         parents_tmp = dict()
         iteration_siblings_tmp = dict()
         work_list = Queue()
-        LOGGER.debug("Parsing {0}".format(self._filename))
-        if not os.path.isfile(self._filename):
-            raise IOError("Workpackage configuration file not found: \"{0}\""
-                          .format(self._filename))
-        tree = ET.parse(self._filename)
-        max_id = -1
-        for element in tree.getroot():
-            Parser._check_tag(element, ["workpackage"])
+        # Template parameters are shared by all workpackages using them
+        base_parameters = dict()
+        environment = dict(os.environ)
+        # Journal entries replace the workpackages of the last snapshot
+        for element in self._workpackage_elements():
             # Read XML-data
             (workpackage_id, step_name, parameterset, parents,
              iteration_siblings, iteration, cycle, set_env, unset_env) = \
-                Parser._extract_workpackage_data(element)
+                Parser._extract_workpackage_data(element, base_parameters)
             # Search for step
             step = benchmark.steps[step_name]
             parameter_names = [parameter.name for parameter in parameterset]
             tmp[workpackage_id] = \
                 jube2.workpackage.Workpackage(benchmark, step, parameter_names,
                                               parameterset, workpackage_id,
-                                              iteration, cycle)
-            max_id = max(max_id, workpackage_id)
+                                              iteration, cycle, environment)
             parents_tmp[workpackage_id] = parents
             iteration_siblings_tmp[workpackage_id] = iteration_siblings
             tmp[workpackage_id].env.update(set_env)
             for env_name in unset_env:
                 if env_name in tmp[workpackage_id].env:
                     del tmp[workpackage_id].env[env_name]
-            if len(parents) == 0:
-                work_list.put(tmp[workpackage_id])
+        for workpackage_id, workpackage in tmp.items():
+            if len(parents_tmp[workpackage_id]) == 0:
+                work_list.put(workpackage)
 
         # Set workpackage counter to current id number
-        jube2.workpackage.Workpackage.id_counter = max_id + 1
+        jube2.workpackage.Workpackage.id_counter = max(tmp, default=-1) + 1
 
         # Rebuild graph structure
         for workpackage_id in parents_tmp:
@@ -534,19 +554,19 @@ class Parser(object):
                 tmp[workpackage_id].iteration_siblings.add(tmp[sibling_id])
 
         # Rebuild history
-        done_list = list()
+        done_ids = set()
         while not work_list.empty():
             workpackage = work_list.get_nowait()
             history = jube2.parameter.Parameterset()
             if workpackage.id in parents_tmp:
                 for parent_id in parents_tmp[workpackage.id]:
                     history.add_parameterset(tmp[parent_id].parameterset)
-            done_list.append(workpackage)
+            done_ids.add(workpackage.id)
             for child in workpackage.children:
                 all_done = True
                 for parent in child.parents:
-                    all_done = all_done and (parent in done_list)
-                if all_done and (child not in done_list):
+                    all_done = all_done and (parent.id in done_ids)
+                if all_done and (child.id not in done_ids):
                     work_list.put(child)
             history.add_parameterset(workpackage.parameterset)
             workpackage.parameterset.add_parameterset(history)
@@ -571,6 +591,9 @@ class Parser(object):
                 final_sub=True)
             workpackage.parameterset.update_parameterset(jube_parameter)
 
+        # Read workpackage states
+        jube2.workpackage.Workpackage.refresh_states(tmp.values())
+
         # Store workpackage data
         work_stat = jube2.util.util.WorkStat()
         for step_name in benchmark.steps:
@@ -588,8 +611,110 @@ class Parser(object):
 
         return workpackages, work_stat
 
+    def workpackage_states_from_xml(self, benchmark):
+        """Read only the workpackage metadata (id, step, iteration and cycle)
+        out of a xml-file, which is enough to determine the workpackage
+        states. Parameters, environment and graph structure are skipped.
+        Return None if the workpackage directories can not be determined
+        without the parameters (step suffix)."""
+        for step in benchmark.steps.values():
+            if step.suffix != "":
+                return None
+        # Dict workpackage_id => (step name, iteration, cycle)
+        metadata = dict()
+        for element in self._workpackage_elements():
+            metadata.update(Parser._extract_workpackage_metadata(element))
+
+        workpackages = dict()
+        for step_name in benchmark.steps:
+            workpackages[step_name] = list()
+        environment = dict(os.environ)
+        for workpackage_id, (step_name, iteration, cycle) in \
+                metadata.items():
+            workpackage = jube2.workpackage.Workpackage(
+                benchmark, benchmark.steps[step_name], list(),
+                jube2.parameter.Parameterset(), workpackage_id, iteration,
+                cycle, environment)
+            workpackage.allow_workpackage_dir_caching()
+            workpackages[step_name].append(workpackage)
+        jube2.workpackage.Workpackage.refresh_states(
+            [workpackage for step_workpackages in workpackages.values()
+             for workpackage in step_workpackages])
+        return workpackages
+
+    @staticmethod
+    def _extract_workpackage_metadata(workpackage_etree):
+        """Extract workpackage metadata from etree
+
+        Return dict workpackage_id => (name of step, iteration, cycle)
+        """
+        Parser._check_tag(workpackage_etree, ["workpackage"])
+        workpackage_id = int(Parser._attribute_from_element(
+            workpackage_etree, "id"))
+        step_etree = workpackage_etree.find("step")
+        if step_etree is None:
+            raise ValueError("<step> is missing in <workpackage> {0}"
+                             .format(workpackage_id))
+        iteration = int(step_etree.get("iteration", "0").strip())
+        cycle = int(step_etree.get("cycle", "0").strip())
+        return {workpackage_id: (step_etree.text.strip(), iteration, cycle)}
+
+    def _workpackage_elements(self):
+        """Yield all workpackage elements of the last snapshot followed by
+        the workpackage journal entries belonging to it. The snapshot is read
+        element by element, yielded elements are cleared afterwards."""
+        filename = jube2.util.util.compressed_alternative(self._filename)
+        LOGGER.debug("Parsing {0}".format(filename))
+        if not os.path.isfile(filename):
+            raise IOError("Workpackage configuration file not found: \"{0}\""
+                          .format(self._filename))
+        journal_id = None
+        depth = 0
+        with jube2.util.util.open_binary(filename) as xml_file:
+            for event, element in ET.iterparse(xml_file,
+                                               events=("start", "end")):
+                if event == "start":
+                    if depth == 0:
+                        root = element
+                        journal_id = root.get("journal")
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 1:
+                    Parser._check_tag(element, ["workpackage"])
+                    yield element
+                    # Drop parameters and environment of processed elements
+                    root.clear()
+        if journal_id is not None:
+            for element in self._journal_elements(journal_id):
+                yield element
+
+    def _journal_elements(self, journal_id):
+        """Return all workpackage elements of the workpackage journal which
+        belong to the snapshot given by journal_id"""
+        elements = list()
+        journal_filename = os.path.join(
+            os.path.dirname(self._filename),
+            jube2.conf.WORKPACKAGES_JOURNAL_FILENAME)
+        if not os.path.isfile(journal_filename):
+            return elements
+        LOGGER.debug("Parsing {0}".format(journal_filename))
+        with open(journal_filename, "rb") as journal_file:
+            for line in journal_file:
+                try:
+                    element = ET.fromstring(line)
+                except ET.ParseError:
+                    # Only an interrupted write can produce broken entries
+                    LOGGER.warning("Skipping incomplete entry in {0}".format(
+                        journal_filename))
+                    continue
+                Parser._check_tag(element, ["workpackage"])
+                if element.get("journal") == journal_id:
+                    elements.append(element)
+        return elements
+
     @staticmethod
-    def _extract_workpackage_data(workpackage_etree):
+    def _extract_workpackage_data(workpackage_etree, base_parameters=None):
         """Extract workpackage information from etree
 
         Return workpackage id, name of step, local parameterset and list of
@@ -607,7 +732,8 @@ class Parser(object):
         step_name = step_etree.text.strip()
         parameterset_etree = workpackage_etree.find("parameterset")
         if parameterset_etree is not None:
-            parameters = Parser._extract_parameters(parameterset_etree)
+            parameters = Parser._extract_parameters(parameterset_etree,
+                                                    base_parameters)
         else:
             parameters = list()
         parameterset = jube2.parameter.Parameterset()
@@ -934,6 +1060,8 @@ class Parser(object):
             if element.tag == "analyse":
                 step_name = Parser._attribute_from_element(element,
                                                            "step").strip()
+                stream = \
+                    element.get("stream", "false").strip().lower() == "true"
                 # If there are no files, just add a dummy element to the list
                 if len(element) == 0:
                     analyser.add_analyse(step_name, None)
@@ -942,6 +1070,8 @@ class Parser(object):
                             (file_etree.text.strip() == ""):
                         raise ValueError("Empty <file> found")
                     else:
+                        file_stream = file_etree.get(
+                            "stream", str(stream)).strip().lower() == "true"
                         use_text = file_etree.get("use")
                         if use_text is not None:
                             use_names = \
@@ -952,7 +1082,7 @@ class Parser(object):
                         for filename in file_etree.text.split(
                                 jube2.conf.DEFAULT_SEPARATOR):
                             file_obj = jube2.analyser.Analyser.AnalyseFile(
-                                filename.strip())
+                                filename.strip(), file_stream)
                             file_obj.add_uses(use_names)
                             analyser.add_analyse(step_name, file_obj)
             elif element.tag == "use":
@@ -1301,10 +1431,12 @@ class Parser(object):
         return parametersets
 
     @staticmethod
-    def _extract_parameters(etree_parameterset):
+    def _extract_parameters(etree_parameterset, base_parameters=None):
         """Extract parameters from parameterset
 
-        Return a list of parameters. Parameters might also include lists"""
+        Return a list of parameters. Parameters might also include lists.
+        base_parameters can be a dictionary to share equal base parameters
+        of selected values between multiple calls."""
         parameters = list()
         for param in etree_parameterset:
             Parser._check_tag(param, ["parameter"])
@@ -1370,6 +1502,12 @@ class Parser(object):
                     name, value, separator, parameter_type, selected_value,
                     parameter_mode, parameter_unit, export, update_mode=parameter_update_mode,
                     idx=idx, eval_helper=None, fixed=False, duplicate=duplicate)
+            if base_parameters is not None and \
+                    parameter.based_on is not None:
+                parameter.based_on = base_parameters.setdefault(
+                    (name, value, separator, parameter_type, parameter_mode,
+                     parameter_unit, export, parameter_update_mode, idx,
+                     duplicate), parameter.based_on)
             parameters.append(parameter)
         return parameters
 
@@ -22,6 +22,9 @@ from __future__ import (print_function,
                         division)
 
 import jube2.jubeio
+import jube2.analyser
+import jube2.result_types.database
+import jube2.warehouse
 import jube2.util.util
 import jube2.util.output
 import jube2.conf
@@ -34,6 +37,7 @@ import sys
 import os
 import re
 import shutil
+import sqlite3
 from distutils.version import StrictVersion
 
 try:
@@ -63,9 +67,9 @@ def continue_benchmarks(args):
 def status(args):
     """Show benchmark status"""
     found_benchmarks = search_for_benchmarks(args)
-    for benchmark_folder in found_benchmarks:
-        benchmark = _load_existing_benchmark(args, benchmark_folder,
-                                             load_analyse=False)
+    for benchmark in _load_existing_benchmarks(args, found_benchmarks,
+                                               load_analyse=False,
+                                               states_only=True):
         if benchmark is None:
             return
         jube2.info.print_benchmark_status(benchmark)
@@ -155,17 +159,108 @@ def benchmarks_results(args):
 
     # Start with the newest benchmark to set the newest result configuration
     found_benchmarks.reverse()
-    cnt = 0
-    for benchmark_folder in found_benchmarks:
-        if (args.num is None) or (cnt < args.num):
-            result_list = _benchmark_result(benchmark_folder=benchmark_folder,
-                                            args=args,
-                                            result_list=result_list)
-            cnt += 1
+    if args.num is not None:
+        found_benchmarks = found_benchmarks[:max(args.num, 0)]
+    # Database results of all benchmarks are written in one transaction
+    with jube2.result_types.database.bulk_transaction():
+        for benchmark_folder, result_data in zip(
+                found_benchmarks,
+                _map_benchmarks(_benchmark_result_data, args,
+                                found_benchmarks)):
+            result_list = _benchmark_result(
+                benchmark_folder=benchmark_folder, args=args,
+                result_list=result_list, result_data=result_data)
     for result_data in result_list:
         result_data.create_result(reverse=args.reverse)
 
 
+def ingest_benchmarks(args):
+    """Store results of new or changed benchmarks in the result warehouse"""
+    if args.id is None:
+        args.id = ["all"]
+    found_benchmarks = search_for_benchmarks(args)
+    warehouse = jube2.warehouse.Warehouse(
+        os.path.join(args.dir, jube2.conf.WAREHOUSE_FILENAME))
+    try:
+        found_ids = set()
+        for benchmark_folder in found_benchmarks:
+            benchmark_id = int(os.path.basename(benchmark_folder))
+            found_ids.add(benchmark_id)
+            if (not args.rebuild) and \
+                    (warehouse.fingerprint(benchmark_id) ==
+                     jube2.warehouse.benchmark_fingerprint(benchmark_folder)):
+                LOGGER.debug("Benchmark {0} is unchanged".format(
+                    benchmark_id))
+                continue
+            benchmark = _load_existing_benchmark(args, benchmark_folder)
+            if benchmark is None:
+                continue
+            jube2.log.change_logfile_name(os.path.join(
+                benchmark_folder, jube2.conf.LOGFILE_RESULT_NAME))
+            warehouse.ingest(benchmark)
+            jube2.log.only_console_log()
+            LOGGER.info("Ingested benchmark {0}".format(benchmark_id))
+        # Remove deleted benchmarks
+        if "all" in args.id:
+            for benchmark_id in warehouse.benchmark_ids:
+                if benchmark_id not in found_ids:
+                    warehouse.remove(benchmark_id)
+                    LOGGER.info("Removed benchmark {0}".format(benchmark_id))
+    finally:
+        warehouse.close()
+
+
+def query_results(args):
+    """Show results stored in the result warehouse"""
+    filename = os.path.join(args.dir, jube2.conf.WAREHOUSE_FILENAME)
+    if not os.path.isfile(filename):
+        raise IOError(("No result warehouse found in \"{0}\", use "
+                       "\"jube ingest\" to create it").format(args.dir))
+    warehouse = jube2.warehouse.Warehouse(filename)
+    try:
+        benchmark_ids = None
+        if (args.id is not None) and ("all" not in args.id):
+            all_ids = warehouse.benchmark_ids
+            benchmark_ids = list()
+            for benchmark_id in args.id:
+                if benchmark_id == "last":
+                    benchmark_ids += all_ids[-1:]
+                elif int(benchmark_id) < 0:
+                    benchmark_ids += all_ids[int(benchmark_id):][:1]
+                else:
+                    benchmark_ids.append(int(benchmark_id))
+        if args.style is None:
+            style = "pretty"
+        else:
+            style = args.style
+        separator = None if style == "pretty" else \
+            jube2.conf.DEFAULT_SEPARATOR
+        for result_name in warehouse.result_names:
+            if (args.only is not None) and (result_name not in args.only):
+                continue
+            columns, rows = warehouse.query(
+                result_name, benchmark_ids=benchmark_ids, select=args.select,
+                condition=args.filter, sort_names=args.sort,
+                reverse=args.reverse)
+            data = [[name for name, _ in columns]]
+            for row in rows:
+                data.append([jube2.warehouse.display_value(value, columns[i][1])
+                             for i, value in enumerate(row[1:])])
+            # If there are multiple benchmarks, add benchmark id information
+            if len(set(row[0] for row in rows)) > 1:
+                data[0].insert(0, "id")
+                for i, row in enumerate(rows):
+                    data[i + 1].insert(0, str(row[0]))
+            if style == "pretty":
+                LOGGER.info("{0}:".format(result_name))
+            LOGGER.info(jube2.util.output.text_table(
+                data, use_header_line=True, auto_linebreak=False, indent=0,
+                style=style, separator=separator))
+            LOGGER.info("\n")
+    finally:
+        warehouse.close()
+
+
 def analyse_benchmarks(args):
     """Analyse benchmarks"""
     found_benchmarks = search_for_benchmarks(args)
@@ -218,10 +313,11 @@ def info(args):
         jube2.info.print_benchmarks_info(args.dir)
     else:
         found_benchmarks = search_for_benchmarks(args)
-        for benchmark_folder in found_benchmarks:
-            benchmark = \
-                _load_existing_benchmark(args, benchmark_folder,
-                                         load_analyse=False)
+        # The benchmark overview only needs the workpackage states
+        states_only = args.step is None and args.workpackage is None
+        for benchmark in _load_existing_benchmarks(args, found_benchmarks,
+                                                   load_analyse=False,
+                                                   states_only=states_only):
             if benchmark is None:
                 continue
             if args.step is None and args.workpackage is None:
@@ -329,8 +425,10 @@ def complete(args):
 
 
 def _load_existing_benchmark(args, benchmark_folder, restore_workpackages=True,
-                             load_analyse=True):
-    """Load an existing benchmark, given by directory benchmark_folder."""
+                             load_analyse=True, states_only=False):
+    """Load an existing benchmark, given by directory benchmark_folder.
+    If states_only is set, the workpackages are restored without their
+    parameters and dependencies, which is enough to show their states."""
 
     jube2.log.change_logfile_name(os.path.join(
         benchmark_folder, jube2.conf.LOGFILE_PARSE_NAME))
@@ -366,19 +464,21 @@ def _load_existing_benchmark(args, benchmark_folder, restore_workpackages=True,
             parser = jube2.jubeio.Parser(os.path.join(
                 benchmark_folder, jube2.conf.WORKPACKAGES_FILENAME),
                 force=args.force, strict=args.strict)
-            workpackages, work_stat = parser.workpackages_from_xml(benchmark)
+            workpackages = None
+            if states_only:
+                workpackages = parser.workpackage_states_from_xml(benchmark)
+            if workpackages is not None:
+                work_stat = jube2.util.util.WorkStat()
+            else:
+                workpackages, work_stat = \
+                    parser.workpackages_from_xml(benchmark)
         except IOError as exeption:
             LOGGER.warning(str(exeption))
             return None
         benchmark.set_workpackage_information(workpackages, work_stat)
 
-    if load_analyse and os.path.isfile(os.path.join(
-            benchmark_folder, jube2.conf.ANALYSE_FILENAME)):
-        # Read existing analyse data
-        parser = jube2.jubeio.Parser(os.path.join(
-            benchmark_folder, jube2.conf.ANALYSE_FILENAME),
-            force=args.force, strict=args.strict)
-        analyse_result = parser.analyse_result_from_xml()
+    if load_analyse:
+        analyse_result = _load_analyse_result(args, benchmark_folder)
         if analyse_result is not None:
             for analyser in benchmark.analyser.values():
                 if analyser.name in analyse_result:
@@ -389,6 +489,30 @@ def _load_existing_benchmark(args, benchmark_folder, restore_workpackages=True,
     return benchmark
 
 
+def _load_analyse_result(args, benchmark_folder):
+    """Load existing analyse data of a benchmark. The analyse database is
+    used if available, analyse.xml is only read if the database is missing
+    or was not updated by the last analyse."""
+    xml_filename = jube2.util.util.compressed_alternative(
+        os.path.join(benchmark_folder, jube2.conf.ANALYSE_FILENAME))
+    db_filename = os.path.join(benchmark_folder,
+                               jube2.conf.ANALYSE_DB_FILENAME)
+    if os.path.isfile(db_filename) and \
+            ((not os.path.isfile(xml_filename)) or
+             (os.path.getmtime(db_filename) >=
+              os.path.getmtime(xml_filename))):
+        try:
+            return jube2.analyser.AnalyseResultStore.read(db_filename)
+        except sqlite3.Error as error:
+            LOGGER.warning("Cannot read analyse database \"{0}\": {1}"
+                           .format(db_filename, error))
+    if os.path.isfile(xml_filename):
+        parser = jube2.jubeio.Parser(xml_filename, force=args.force,
+                                     strict=args.strict)
+        return parser.analyse_result_from_xml()
+    return None
+
+
 def manipulate_comments(args):
     """Manipulate benchmark comment"""
     found_benchmarks = search_for_benchmarks(args)
@@ -453,10 +577,8 @@ def search_for_workpackage(args, search_for_step=False):
     """Search for existing workpackages"""
     found_benchmarks = search_for_benchmarks(args)
     found_workpackages = list()
-    for benchmark_folder in found_benchmarks:
-        benchmark = \
-            _load_existing_benchmark(args, benchmark_folder,
-                                     load_analyse=False)
+    for benchmark in _load_existing_benchmarks(args, found_benchmarks,
+                                               load_analyse=False):
         if benchmark is not None:
             if args.workpackage:
                 for wp_id in args.workpackage:
@@ -552,7 +674,7 @@ def run_new_benchmark(args):
             if args.outpath is not None:
                 bench.outpath = args.outpath
             # Start benchmark run
-            bench.new_run()
+            bench.new_run(procs=args.procs)
             # Run analyse
             if args.analyse or args.result:
                 jube2.log.change_logfile_name(os.path.join(
@@ -588,7 +710,7 @@ def _continue_benchmark(benchmark_folder, args):
         benchmark_folder, jube2.conf.LOGFILE_CONTINUE_NAME))
 
     # Run existing benchmark
-    benchmark.run()
+    benchmark.run(procs=args.procs)
 
     # Run analyse
     if args.analyse or args.result:
@@ -627,7 +749,7 @@ def _analyse_benchmark(benchmark_folder, args):
     LOGGER.info(jube2.util.output.text_boxed(
         ("Analyse benchmark \"{0}\" id: {1}").format(benchmark.name,
                                                      benchmark.id)))
-    benchmark.analyse()
+    benchmark.analyse(procs=args.procs)
     if os.path.isfile(
             os.path.join(benchmark_folder, jube2.conf.ANALYSE_FILENAME)):
         LOGGER.info(">>> Analyse data storage: {0}".format(os.path.join(
@@ -641,18 +763,44 @@ def _analyse_benchmark(benchmark_folder, args):
     jube2.log.only_console_log()
 
 
-def _benchmark_result(benchmark_folder, args, result_list=None):
-    """Show benchmark result"""
-    benchmark = _load_existing_benchmark(args, benchmark_folder)
+def _benchmark_result(benchmark_folder, args, result_list=None,
+                      result_data=None):
+    """Show benchmark result. result_data can contain the already created
+    result data of this benchmark (see _benchmark_result_data)."""
     if result_list is None:
         result_list = list()
+    if result_data is None:
+        result_data = _benchmark_result_data(args, benchmark_folder)
+
+    jube2.log.change_logfile_name(os.path.join(
+        benchmark_folder, jube2.conf.LOGFILE_RESULT_NAME))
+
+    # Store benchmark results and combine them with the results of the
+    # other benchmarks
+    for data, filename in result_data:
+        data.create_result(show=False, filename=filename)
+        if data in result_list:
+            result_list[result_list.index(data)].add_result_data(data)
+        else:
+            result_list.append(data)
+
+    # Reset logging
+    jube2.log.only_console_log()
+
+    return result_list
+
+
+def _benchmark_result_data(args, benchmark_folder):
+    """Return list of (result data, result filename) tuples of the given
+    benchmark"""
+    benchmark = _load_existing_benchmark(args, benchmark_folder)
 
     if benchmark is None:
-        return result_list
+        return list()
 
     if (args.update is None) and (args.tag is not None) and \
             (len(benchmark.tags & set(args.tag)) == 0):
-        return result_list
+        return list()
 
     # Update benchmark data
     _update_analyse_and_result(args, benchmark)
@@ -668,16 +816,73 @@ def _benchmark_result(benchmark_folder, args, result_list=None):
         benchmark_folder, jube2.conf.LOGFILE_RESULT_NAME))
 
     # Create benchmark results
-    result_list = benchmark.create_result(only=args.only,
-                                          data_list=result_list,
-                                          style=args.style,
-                                          select=args.select,
-                                          exclude=args.exclude)
+    result_data = benchmark.create_result_data(only=args.only,
+                                               style=args.style,
+                                               select=args.select,
+                                               exclude=args.exclude)
 
     # Reset logging
     jube2.log.only_console_log()
 
-    return result_list
+    return result_data
+
+
+def _call_for_benchmark(func, args, benchmark_folder, kwargs):
+    """Run func(args, benchmark_folder, **kwargs), used by worker
+    processes"""
+    return func(args, benchmark_folder, **kwargs)
+
+
+def _map_benchmarks(func, args, benchmark_folders, **kwargs):
+    """Yield func(args, benchmark_folder, **kwargs) for all given benchmark
+    folders in the given order. If args.procs > 1, the calls are distributed
+    to worker processes."""
+    procs = getattr(args, "procs", None) or 1
+    if (procs <= 1) or (len(benchmark_folders) <= 1):
+        for benchmark_folder in benchmark_folders:
+            yield func(args, benchmark_folder, **kwargs)
+        return
+
+    worker_pool = jube2.util.util.WorkerPool(
+        min(procs, len(benchmark_folders)))
+    # Only a few benchmarks are submitted in advance, so that the number
+    # of return values waiting to be yielded stays bounded
+    max_in_flight = 2 * worker_pool.processes
+    submitted = 0
+    try:
+        # Return values in benchmark order, independent of the order in
+        # which the worker processes finished
+        values = dict()
+        for i in range(len(benchmark_folders)):
+            while submitted < min(i + max_in_flight, len(benchmark_folders)):
+                worker_pool.submit(
+                    submitted, _call_for_benchmark,
+                    (func, args, benchmark_folders[submitted], kwargs))
+                submitted += 1
+            while i not in values:
+                index, value, error = worker_pool.wait()
+                if error is not None:
+                    raise error
+                values[index] = value
+            yield values.pop(i)
+    except BaseException:
+        worker_pool.terminate()
+        raise
+    worker_pool.close()
+
+
+def _load_existing_benchmarks(args, benchmark_folders, **kwargs):
+    """Yield all benchmarks given by benchmark_folders in the given order
+    (see _load_existing_benchmark). Benchmarks are loaded by args.procs
+    worker processes."""
+    for benchmark_folder, benchmark in zip(
+            benchmark_folders,
+            _map_benchmarks(_load_existing_benchmark, args,
+                            benchmark_folders, **kwargs)):
+        # Log into the benchmark specific log like a serial loading
+        jube2.log.change_logfile_name(os.path.join(
+            benchmark_folder, jube2.conf.LOGFILE_PARSE_NAME))
+        yield benchmark
 
 
 def _update_analyse_and_result(args, benchmark):
@@ -835,7 +1040,11 @@ def gen_subparser_conf():
             ("-m", "--comment"):
                 {"help": "add comment"},
             ("-o", "--outpath"):
-                {"help": "overwrite outpath directory"}
+                {"help": "overwrite outpath directory"},
+            ("-j", "--procs"):
+                {"type": int, "metavar": "N",
+                 "help": "run up to N workpackages of independent steps "
+                 "at the same time"}
         }
     }
 
@@ -857,7 +1066,11 @@ def gen_subparser_conf():
             ("-a", "--analyse"):
                 {"action": "store_true", "help": "run analyse"},
             ("-r", "--result"):
-                {"action": "store_true", "help": "show results"}
+                {"action": "store_true", "help": "show results"},
+            ("-j", "--procs"):
+                {"type": int, "metavar": "N",
+                 "help": "run up to N workpackages of independent steps "
+                 "at the same time"}
         }
     }
 
@@ -878,7 +1091,11 @@ def gen_subparser_conf():
             ("--include-path",):
                 {"nargs": "+", "help": "directory containing include files"},
             ("-t", "--tag"):
-                {"nargs": "+", "help": "select tags"}
+                {"nargs": "+", "help": "select tags"},
+            ("-j", "--procs"):
+                {"type": int, "metavar": "N",
+                 "help": "number of processes used to analyse the "
+                 "workpackages"}
         }
     }
 
@@ -920,7 +1137,59 @@ def gen_subparser_conf():
                  "(changes also the output to the result file)"},
             ("--exclude",):
                 {"nargs": "+", "help": "excludes given columns from the result "
-                 "(changes also the output to the result file)"}
+                 "(changes also the output to the result file)"},
+            ("-j", "--procs"):
+                {"type": int, "metavar": "N",
+                 "help": "number of processes used to load the benchmarks"}
+        }
+    }
+
+    # ingest subparser
+    subparser_configuration["ingest"] = {
+        "help": "store benchmark results in the result warehouse",
+        "func": ingest_benchmarks,
+        "arguments": {
+            ("dir",):
+                {"metavar": "DIRECTORY", "nargs": "?",
+                 "help": "benchmark directory", "default": "."},
+            ("-i", "--id"):
+                {"help": "use benchmarks given by id (default: all)",
+                 "nargs": "+"},
+            ("--rebuild",):
+                {"action": "store_true",
+                 "help": "also ingest unchanged benchmarks"}
+        }
+    }
+
+    # query subparser
+    subparser_configuration["query"] = {
+        "help": "show results stored in the result warehouse",
+        "func": query_results,
+        "arguments": {
+            ("dir",):
+                {"metavar": "DIRECTORY", "nargs": "?",
+                 "help": "benchmark directory", "default": "."},
+            ("-i", "--id"):
+                {"help": "use benchmarks given by id (default: all)",
+                 "nargs": "+"},
+            ("-o", "--only"):
+                {"nargs": "+", "metavar": "RESULT_NAME",
+                 "help": "only show results given by specific name"},
+            ("-r", "--reverse"):
+                {"help": "reverse benchmark output order",
+                 "action": "store_true"},
+            ("-s", "--style"):
+                {"help": "table style type",
+                 "choices": ["pretty", "csv", "aligned"]},
+            ("--select",):
+                {"nargs": "+", "help": "display only given columns"},
+            ("--filter",):
+                {"metavar": "CONDITION",
+                 "help": "SQL condition to select rows, columns are "
+                 "referenced by $name (e.g. \"$nodes > 2\")"},
+            ("--sort",):
+                {"nargs": "+", "metavar": "COLUMN",
+                 "help": "sort rows by given columns"}
         }
     }
 
@@ -946,7 +1215,10 @@ def gen_subparser_conf():
                  "metavar": "SEPARATOR"},
             ("-w", "--workpackage"):
                 {"help": "show information for given workpackage id",
-                 "nargs": "*"}
+                 "nargs": "*"},
+            ("-j", "--procs"):
+                {"type": int, "metavar": "N",
+                 "help": "number of processes used to load the benchmarks"}
         }
     }
 
@@ -960,7 +1232,10 @@ def gen_subparser_conf():
                  "help": "benchmark directory", "default": "."},
             ("-i", "--id"):
                 {"help": "use benchmarks given by id",
-                 "nargs": "+"}
+                 "nargs": "+"},
+            ("-j", "--procs"):
+                {"type": int, "metavar": "N",
+                 "help": "number of processes used to load the benchmarks"}
         }
     }
     
@@ -984,7 +1259,10 @@ def gen_subparser_conf():
                 {"help": "display content of output file" , "action": "store_true"},
             ("-o", "--only"):
                 {"help": "show only stdour or stderr",
-                 "choices": ["stdout", "stderr"]}
+                 "choices": ["stdout", "stderr"]},
+            ("-j", "--procs"):
+                {"type": int, "metavar": "N",
+                 "help": "number of processes used to load the benchmarks"}
         }
     }
 
@@ -1023,7 +1301,10 @@ def gen_subparser_conf():
                  "nargs": "+"},
             ("-f", "--force"):
                 {"help": "force removing, never prompt",
-                 "action": "store_true"}
+                 "action": "store_true"},
+            ("-j", "--procs"):
+                {"type": int, "metavar": "N",
+                 "help": "number of processes used to load the benchmarks"}
         }
     }
 
@@ -23,6 +23,7 @@ from __future__ import (print_function,
 
 import itertools
 import os
+import sys
 import xml.etree.ElementTree as ET
 import copy
 import jube2.util.util
@@ -46,23 +47,53 @@ UPDATE_MODES = (JUBE_MODE, NEVER_MODE, STEP_MODE,
 class Parameterset(object):
 
     """A parameterset represent a template or a specific product space. It
-    can be combined with other Parametersets."""
+    can be combined with other Parametersets.
+
+    Parametersets use copy-on-write: copies share the parameter dictionary
+    and the Parameter objects until one of them is changed. Parameter objects
+    must therefore not be modified once they were added to a Parameterset,
+    changed parameters are added as new objects instead."""
 
     def __init__(self, name="", duplicate="replace"):
         self._name = name
         self._duplicate = duplicate
         self._parameters = dict()
+        self._shared = False
+        self._version = 0
+        # name -> (parameter, dependencies) of parameters whose
+        # substitution did not change anything, shared between copies
+        self._unchanged = dict()
 
     def clear(self):
         """Remove all stored parameters"""
         self._parameters = dict()
+        self._shared = False
+        self._version += 1
+        self._unchanged = dict()
 
     def copy(self):
-        """Returns a deepcopy of the Parameterset"""
+        """Returns a copy of the Parameterset, the parameters are shared
+        until one of both Parametersets is changed"""
         new_parameterset = Parameterset(self._name, self._duplicate)
-        new_parameterset.add_parameterset(self)
+        new_parameterset._parameters = self._parameters
+        new_parameterset._shared = True
+        new_parameterset._unchanged = self._unchanged
+        self._shared = True
         return new_parameterset
 
+    def _before_change(self):
+        """Create a private parameter dictionary before changing it and
+        update the version"""
+        if self._shared:
+            self._parameters = dict(self._parameters)
+            self._shared = False
+        self._version += 1
+
+    @property
+    def version(self):
+        """Return a number which changes whenever the parameters change"""
+        return self._version
+
     @property
     def name(self):
         """Return name of the Parameterset"""
@@ -99,15 +130,23 @@ class Parameterset(object):
     def add_parameterset(self, parameterset):
         """Add all parameters from given parameterset, existing ones will
         be overwritten"""
+        if len(self._parameters) == 0:
+            # Nothing to combine, share the parameters
+            self._parameters = parameterset._parameters
+            self._shared = True
+            self._version += 1
+            parameterset._shared = True
+            return self
         for parameter in parameterset:
-            self.add_parameter(parameter.copy())
+            self.add_parameter(parameter)
         return self
 
     def update_parameterset(self, parameterset):
         """Overwrite existing parameters. Do not add new parameters"""
         for parameter in parameterset:
             if parameter.name in self:
-                self._parameters[parameter.name] = parameter.copy()
+                self._before_change()
+                self._parameters[parameter.name] = parameter
 
     def concat_parameter(self, parameter):
         """Concatenate a new parameter to a potentially existing one."""
@@ -146,6 +185,7 @@ class Parameterset(object):
 
     def add_parameter(self, parameter):
         """Add a new parameter"""
+        self._before_change()
         if parameter.name not in self._parameters.keys():
             self._parameters[parameter.name] = parameter
         else:
@@ -195,6 +235,7 @@ class Parameterset(object):
         else:
             name = parameter
         if name in self._parameters:
+            self._before_change()
             del self._parameters[name]
 
     @property
@@ -207,6 +248,15 @@ class Parameterset(object):
                          jube2.conf.ALLOWED_SCRIPTTYPES.union(
                              jube2.conf.ALLOWED_ADVANCED_MODETYPES))])
 
+    def constant_parameter(self, name):
+        """Return the constant parameter of the given name or None"""
+        parameter = self._parameters.get(name)
+        if parameter is None or parameter.is_template or \
+                parameter.mode in jube2.conf.ALLOWED_SCRIPTTYPES.union(
+                    jube2.conf.ALLOWED_ADVANCED_MODETYPES):
+            return None
+        return parameter
+
     @property
     def template_parameter_dict(self):
         """Return dictionary representation of all template parameters"""
@@ -340,35 +390,40 @@ class Parameterset(object):
         added to the set. final_sub marks the last substitution process."""
         set_changed = True
         count = 0
+        depend_dict = None
         while set_changed and (not self.has_templates) and \
                 (count < jube2.conf.MAX_RECURSIVE_SUB):
             set_changed = False
             count += 1
 
-            # Create dependencies
-            depend_dict = dict()
-            for par in self:
-                if not par.is_template:
-                    depend_dict[par.name] = set()
-                    for other_par in self:
-                        # search for parameter usage
-                        if par.depends_on(other_par):
-                            depend_dict[par.name].add(other_par.name)
+            # Create dependencies once, afterwards only the dependencies of
+            # changed parameters are updated
+            if depend_dict is None:
+                depend_dict = dict([(par.name, par.depending_parameter &
+                                     self._parameters.keys())
+                                    for par in self])
 
             # Resolve dependencies
             substitution_list = [self._parameters[name] for name in
                                  jube2.util.util.resolve_depend(depend_dict)]
 
             # Do substition and evaluation if possible
-            set_changed = self.__substitute_parameters_in_list(
+            changed_names = self.__substitute_parameters_in_list(
                 substitution_list, additional_parametersets)
 
             # Run forced evaluation if there were no further changes
-            if not set_changed:
-                set_changed = self.__substitute_parameters_in_list(
+            if len(changed_names) == 0:
+                changed_names = self.__substitute_parameters_in_list(
                     substitution_list, additional_parametersets,
                     force_evaluation=True)
 
+            set_changed = len(changed_names) > 0
+            for name in changed_names:
+                par = self._parameters[name]
+                if not par.is_template:
+                    depend_dict[name] = \
+                        par.depending_parameter & self._parameters.keys()
+
         if final_sub:
             parameter = [par for par in self]
             for par in parameter:
@@ -389,10 +444,23 @@ class Parameterset(object):
         """Substitute all parameter inside the given parameter_list.
         Parameters from additional_parameterset will be used for substitution
         but will not be added to the set. force_evaluation will force
-        script parameter evaluation"""
-        set_changed = False
+        script parameter evaluation. parameter_list must be ordered by
+        the dependencies of the parameters.
+
+        Return the names of the changed parameters"""
+        changed_names = set()
         for par in parameter_list:
             if par.can_substitute_and_evaluate(self):
+                # Text parameters are not evaluated, a repeated substitution
+                # using the same dependencies can be skipped
+                reusable = additional_parametersets is None and \
+                    par.mode == "text" and par.eval_helper is None
+                if reusable:
+                    dependencies = tuple(
+                        [self._parameters.get(name) for name in
+                         par.depending_parameter])
+                    if self._unchanged.get(par.name) == (par, dependencies):
+                        continue
                 parametersets = [self]
                 if additional_parametersets is not None:
                     parametersets += additional_parametersets
@@ -401,8 +469,16 @@ class Parameterset(object):
                         parametersets, force_evaluation=force_evaluation)
                 if param_changed:
                     self.add_parameter(new_par)
-                set_changed = set_changed or param_changed
-        return set_changed
+                    changed_names.add(par.name)
+                    # A text value without any $ can not change anymore
+                    if additional_parametersets is None and \
+                            new_par.mode == "text" and \
+                            new_par.eval_helper is None and \
+                            "$" not in new_par.value:
+                        self._unchanged[par.name] = (new_par, ())
+                elif reusable:
+                    self._unchanged[par.name] = (par, dependencies)
+        return changed_names
 
 
 class Parameter(object):
@@ -410,6 +486,10 @@ class Parameter(object):
     """Contains data for single Parameter. This Parameter can be a constant
     value, a template or a specific value out of a given template"""
 
+    __slots__ = ("_name", "_value", "_separator", "_type", "_mode", "_unit",
+                 "_based_on", "_export", "_idx", "_update_mode",
+                 "_eval_helper", "_duplicate")
+
     # This regex can be used to find variables inside parameter values
     parameter_regex = \
         re.compile(r"(?<!\$)(?:\$\$)*\$(?!\$)(\{)?(\w+?)(?(1)\}|(?=\W|$))")
@@ -417,15 +497,17 @@ class Parameter(object):
     def __init__(self, name, value, separator=None, parameter_type="string",
                  parameter_mode="text", unit="", export=False,
                  update_mode=NEVER_MODE, idx=-1, eval_helper=None, duplicate="none"):
-        self._name = name
+        # Names and options are shared by many parameters, interning them
+        # keeps only a single copy of each string
+        self._name = sys.intern(name)
         self._value = value
         if separator is None:
             self._separator = jube2.conf.DEFAULT_SEPARATOR
         else:
-            self._separator = separator
-        self._type = parameter_type
-        self._mode = parameter_mode
-        self._unit = unit
+            self._separator = sys.intern(separator)
+        self._type = sys.intern(parameter_type)
+        self._mode = sys.intern(parameter_mode)
+        self._unit = sys.intern(unit)
         self._based_on = None
         self._export = export
         self._idx = idx
@@ -434,7 +516,7 @@ class Parameter(object):
         else:
             self._update_mode = NEVER_MODE
         self._eval_helper = eval_helper
-        self._duplicate=duplicate
+        self._duplicate = sys.intern(duplicate)
 
     @staticmethod
     def create_parameter(name, value, separator=None, parameter_type="string",
@@ -677,8 +759,15 @@ class Parameter(object):
 
         return parameter_etree
 
+    def _attribute_dict(self):
+        """Return dictionary of all set attributes"""
+        return dict([(attribute, getattr(self, attribute))
+                     for cls in type(self).__mro__
+                     for attribute in getattr(cls, "__slots__", ())
+                     if hasattr(self, attribute)])
+
     def __repr__(self):
-        return "Parameter({0})".format(self.__dict__)
+        return "Parameter({0})".format(self._attribute_dict())
 
     def __getitem__(self, propertyString):
         return getattr(self, propertyString)
@@ -688,6 +777,8 @@ class StaticParameter(Parameter):
 
     """A StaticParameter can be substituted and evaluated."""
 
+    __slots__ = ("_depending_parameter",)
+
     def __init__(self, name, value, separator=None, parameter_type="string",
                  parameter_mode="text", unit="", export=False,
                  update_mode=NEVER_MODE, idx=-1, eval_helper=None, duplicate="none"):
@@ -695,8 +786,8 @@ class StaticParameter(Parameter):
                            parameter_mode, unit, export, update_mode, idx,
                            eval_helper, duplicate)
         self._depending_parameter = \
-            set([other_par[1] for other_par in
-                 re.findall(Parameter.parameter_regex, self._value)])
+            frozenset([other_par[1] for other_par in
+                       re.findall(Parameter.parameter_regex, self._value)])
 
     def can_substitute_and_evaluate(self, parameterset):
         """A parameter can be substituted and evaluated if there are no
@@ -708,6 +799,11 @@ class StaticParameter(Parameter):
                           jube2.conf.ALLOWED_ADVANCED_MODETYPES)))
                     for param_name in self._depending_parameter])
 
+    @property
+    def depending_parameter(self):
+        """Return names of all parameters used inside the value"""
+        return self._depending_parameter
+
     def depends_on(self, parameter):
         """Checks the parameter depends on an other parameter."""
         return (parameter.name in self._depending_parameter)
@@ -728,8 +824,11 @@ class StaticParameter(Parameter):
         parameter_dict = dict()
         if parametersets is not None:
             for parameterset in parametersets:
-                for name, param in parameterset.\
-                        constant_parameter_dict.items():
+                # Only the parameters used inside the value are needed
+                for name in self._depending_parameter:
+                    param = parameterset.constant_parameter(name)
+                    if param is None:
+                        continue
                     # Avoid evaluation of fixed parameter content
                     if param.is_fixed and "$" in param.value:
                         parameter_dict[name] = re.sub(r"\$", "$$", param.value)
@@ -810,7 +909,12 @@ class StaticParameter(Parameter):
                                                eval_helper=None,
                                                fixed=final_sub,
                                                duplicate=self._duplicate)
-            param.based_on = self
+            # A fixed parameter does not change anymore, only the root of
+            # its history is needed
+            if final_sub:
+                param.based_on = self.based_on_root
+            else:
+                param.based_on = self
         else:
             param = self
         return param, changed
@@ -838,6 +942,8 @@ class TemplateParameter(Parameter):
     which can be accessed by a single name. To use the template in a specific
     environment, it must be expanded."""
 
+    __slots__ = ()
+
     @property
     def value(self):
         """Return Template values"""
@@ -869,13 +975,15 @@ class FixedParameter(StaticParameter):
     It represents a fixed value.
     """
 
+    __slots__ = ()
+
     def __init__(self, name, value, separator=None, parameter_type="string",
                  parameter_mode="text", unit="", export=False,
                  update_mode=NEVER_MODE, idx=-1, eval_helper=None, duplicate="none"):
         StaticParameter.__init__(self, name, value, separator, parameter_type,
                                  parameter_mode, unit, export, update_mode, idx,
                                  eval_helper, duplicate)
-        self._depending_parameter = set()
+        self._depending_parameter = frozenset()
 
     def substitute_and_evaluate(self, parametersets=None,
                                 final_sub=False, no_templates=False,
@@ -167,6 +167,8 @@ class Pattern(jube2.parameter.StaticParameter):
     """A pattern can be used to scan a result file, using regular expression,
     or to represent a derived pattern."""
 
+    __slots__ = ("_derived", "_default", "_dotall")
+
     def __init__(self, name, value, pattern_mode="pattern",
                  content_type="string", unit="", default=None, dotall=False):
         self._derived = pattern_mode != "pattern"
@@ -283,7 +285,7 @@ class Pattern(jube2.parameter.StaticParameter):
         return pattern_etree
 
     def __repr__(self):
-        return "Pattern({0})".format(self.__dict__)
+        return "Pattern({0})".format(self._attribute_dict())
 
 
 def get_jube_pattern():
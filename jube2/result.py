@@ -25,6 +25,7 @@ import jube2.util.util
 import xml.etree.ElementTree as ET
 import re
 import jube2.log
+import jube2.conf
 
 LOGGER = jube2.log.get_logger(__name__)
 
@@ -140,13 +141,11 @@ class Result(object):
 
             while (len(last_wps) > 0):
                 next_id = last_wps.pop()
-                # Create new chain
-                wp_chains.append(list())
-                # Add all parents to the chain
-                for wp in self._benchmark.workpackage_by_id(next_id).\
-                        parent_history:
-                    if wp.id not in wp_chains[-1]:
-                        wp_chains[-1].append(wp.id)
+                # Create new chain containing all parents (each parent is
+                # only listed once inside the parent history)
+                wp_chains.append(
+                    [wp.id for wp in self._benchmark.workpackage_by_id(
+                        next_id).parent_history])
                 # Add wp itself to the chain
                 wp_chains[-1].append(next_id)
 
@@ -195,7 +194,9 @@ class Result(object):
 
         alt_pattern_names = list(pattern_names)
         for i, pattern_name in enumerate(alt_pattern_names):
-            for option in ["first", "last", "min", "max", "avg", "sum", "std"]:
+            for option in ["first", "last", "min", "max", "avg", "sum",
+                           "std"] + ["p{0}".format(percentile) for percentile
+                                     in jube2.conf.PATTERN_PERCENTILES]:
                 matcher = re.match("^(.+)_{0}$".format(option), pattern_name)
                 if matcher:
                     alt_pattern_names[i] = matcher.group(1)
@@ -20,6 +20,7 @@
 from __future__ import (print_function,
                         unicode_literals,
                         division)
+import contextlib
 import sqlite3
 import ast
 import os
@@ -28,9 +29,60 @@ from jube2.result_types.genericresult import GenericResult
 from jube2.result import Result
 import xml.etree.ElementTree as ET
 import jube2.log
+import jube2.conf
 
 LOGGER = jube2.log.get_logger(__name__)
 
+# db file -> open database connection, while a bulk transaction is active
+_BULK_CONNECTIONS = None
+
+
+def _quote(identifier):
+    """Quote a SQL identifier"""
+    return "\"{0}\"".format(identifier.replace("\"", "\"\""))
+
+
+def _create_table_query(table_name, columns, primekeys):
+    """Return the query to create a table with the given (name, type)
+    columns"""
+    col_definitions = ", ".join("{0} {1}".format(_quote(name), dtype)
+                                for name, dtype in columns)
+    if len(primekeys) > 0:
+        col_definitions += ", PRIMARY KEY ({0})".format(
+            ", ".join(_quote(key) for key in primekeys))
+    return "CREATE TABLE IF NOT EXISTS {0} ({1})".format(_quote(table_name),
+                                                        col_definitions)
+
+
+def _connect(db_file):
+    """Open a database connection and start a new transaction"""
+    con = sqlite3.connect(db_file, isolation_level=None)
+    for pragma in jube2.conf.RESULT_DATABASE_PRAGMAS:
+        con.execute("PRAGMA " + pragma)
+    con.execute("BEGIN")
+    return con
+
+
+@contextlib.contextmanager
+def bulk_transaction():
+    """All database results created inside of this context share one
+    connection and one transaction per database file, which is committed
+    when the context is left without an error"""
+    global _BULK_CONNECTIONS
+    if _BULK_CONNECTIONS is not None:
+        yield
+        return
+    _BULK_CONNECTIONS = dict()
+    try:
+        yield
+        for con in _BULK_CONNECTIONS.values():
+            con.execute("COMMIT")
+    finally:
+        # closing a connection discards its uncommitted changes
+        for con in _BULK_CONNECTIONS.values():
+            con.close()
+        _BULK_CONNECTIONS = None
+
 
 class Database(GenericResult):
 
@@ -84,66 +136,87 @@ class Database(GenericResult):
                 return None
 
             # create database and insert the data
-            con = sqlite3.connect(db_file)
-            cur = con.cursor()
-
-            # create a string of keys and their data type to create the database table
-            key_dtypes = {k.name: type(v[0]).__name__.replace(
-                'str', 'text') for (k, v) in self._data.items()}
-            db_col_insert_types = str(key_dtypes).replace(
-                '{', '(').replace('}', ')').replace("'", '').replace(':', '')
-
-            if len(self._primekeys) > 0:
-                db_col_insert_types = db_col_insert_types[:-1] + \
-                    ", PRIMARY KEY ({}))".format(', '.join(map(repr, self._primekeys)))
-            # create new table with a name of stored in variable self.name if it does not exists
-            LOGGER.debug("CREATE TABLE IF NOT EXISTS {} {};".format(
-                self.name, db_col_insert_types))
-            cur.execute("CREATE TABLE IF NOT EXISTS {} {};".format(
-                self.name, db_col_insert_types))
+            if _BULK_CONNECTIONS is None:
+                con = _connect(db_file)
+                try:
+                    self._write_data(con, keys)
+                    con.execute("COMMIT")
+                finally:
+                    con.close()
+            else:
+                connection_key = os.path.realpath(db_file)
+                if connection_key not in _BULK_CONNECTIONS:
+                    _BULK_CONNECTIONS[connection_key] = _connect(db_file)
+                self._write_data(_BULK_CONNECTIONS[connection_key], keys)
+
+            # Print database location to screen and result.log
+            LOGGER.info("Database location of id {}: {}".format(
+                self._benchmark_ids[0], db_file))
+
+        def _write_data(self, con, keys):
+            """Write data into the result table using the given database
+            connection"""
+            # column data type is given by the first available value
+            key_dtypes = dict()
+            for key, values in self._data.items():
+                key_dtypes[key.name] = "text"
+                for value in values:
+                    if value is not None:
+                        key_dtypes[key.name] = \
+                            type(value).__name__.replace('str', 'text')
+                        break
+
+            # create new table with a name of stored in variable self.name
+            # if it does not exists
+            create_query = _create_table_query(
+                self.name, [(key, key_dtypes[key]) for key in keys],
+                self._primekeys)
+            LOGGER.debug(create_query)
+            con.execute(create_query)
 
             # check for primary keys in database table
-            cur.execute('PRAGMA TABLE_INFO({})'.format(self.name))
-            db_primary_keys = [i[1] for i in cur.fetchall() if i[5] != 0]
+            table_info = con.execute("PRAGMA table_info({0})".format(
+                _quote(self.name))).fetchall()
+            db_primary_keys = [i[1] for i in table_info if i[5] != 0]
             if not set(self._primekeys) == set(db_primary_keys):
                 raise ValueError("Modification of primary values is not supported. " +
                                  "Primary keys of table {} are {}".format(self.name, db_primary_keys))
 
-            # compare self._keys with columns in db and add new column in the database if it does not exist
-            cur.execute("SELECT * FROM {}".format(self.name))
-            db_col_names = [tup[0] for tup in cur.description]
-
-            # delete columns, which were removed as keys in this execution
-            diff_col_list = list(set(db_col_names).difference(keys))
-            if len(diff_col_list) != 0:
-                for col in diff_col_list:
-                    LOGGER.debug(
-                        "ALTER TABLE {} DROP COLUMN {}".format(self.name, col))
-                    cur.execute(
-                        "ALTER TABLE {} DROP COLUMN {}".format(self.name, col))
-
-            # add columns, which were added as keys in this execution
-            diff_col_list = list(set(keys).difference(db_col_names))
-            if len(diff_col_list) != 0:
-                for col in diff_col_list:
-                    LOGGER.debug("ALTER TABLE {} ADD COLUMN {} {}".format(
-                        self.name, col, type(col).__name__.replace('str', 'text')))
-                    cur.execute("ALTER TABLE {} ADD COLUMN {} {}".format(
-                        self.name, col, type(col).__name__.replace('str', 'text')))
+            # compare keys with columns in db
+            db_col_names = [i[1] for i in table_info]
+            added_cols = [key for key in keys if key not in db_col_names]
+            if any(col not in keys for col in db_col_names):
+                # columns, which were removed as keys in this execution, are
+                # deleted by rebuilding the table once
+                kept_cols = ", ".join(_quote(i[1]) for i in table_info
+                                      if i[1] in keys)
+                tmp_name = self.name + "_jube_migration"
+                migration = [
+                    _create_table_query(
+                        tmp_name, [(i[1], i[2]) for i in table_info
+                                   if i[1] in keys] +
+                        [(col, key_dtypes[col]) for col in added_cols],
+                        self._primekeys),
+                    "INSERT INTO {0} ({1}) SELECT {1} FROM {2}".format(
+                        _quote(tmp_name), kept_cols, _quote(self.name)),
+                    "DROP TABLE {0}".format(_quote(self.name)),
+                    "ALTER TABLE {0} RENAME TO {1}".format(
+                        _quote(tmp_name), _quote(self.name))]
+            else:
+                # add columns, which were added as keys in this execution
+                migration = ["ALTER TABLE {0} ADD COLUMN {1} {2}".format(
+                    _quote(self.name), _quote(col), key_dtypes[col])
+                    for col in added_cols]
+            for query in migration:
+                LOGGER.debug(query)
+                con.execute(query)
 
             # insert or replace self.data in database
-            replace_query = "REPLACE INTO {} {} VALUES (".format(
-                self.name, tuple(keys)) + "{}".format('?,'*len(keys))[:-1] + ");"
+            replace_query = "REPLACE INTO {0} ({1}) VALUES ({2})".format(
+                _quote(self.name), ", ".join(_quote(key) for key in keys),
+                ", ".join("?" * len(keys)))
             LOGGER.debug(replace_query)
-            cur.executemany(
-                replace_query, [d for d in list(zip(*self._data.values()))])
-
-            con.commit()
-            con.close()
-
-            # Print database location to screen and result.log
-            LOGGER.info("Database location of id {}: {}".format(
-                self._benchmark_ids[0], db_file))
+            con.executemany(replace_query, zip(*self._data.values()))
 
     def __init__(self, name, res_filter=None, primekeys=None, db_file=None):
         GenericResult.__init__(self, name, res_filter)
@@ -294,33 +294,26 @@ class Step(object):
         global_parameterset.update_parameterset(update_parameters)
 
         # Set tag-mode evaluation helper function to allow access to tag list
-        # during paramter evaluation
+        # during paramter evaluation (parameters can be shared with other
+        # parametersets and are replaced by a copy instead of being changed)
+        tag_parameters = jube2.parameter.Parameterset()
         for parameter in global_parameterset.all_parameters:
             if parameter.mode == "tag":
+                parameter = parameter.copy()
                 parameter.eval_helper = \
                     lambda tag: tag if tag in benchmark.tags else ""
+                tag_parameters.add_parameter(parameter)
+        global_parameterset.update_parameterset(tag_parameters)
 
-        # Expand templates
-        parametersets = [global_parameterset]
-        change = True
-        while change:
-            change = False
-            new_parametersets = list()
-            for parameterset in parametersets:
-                parameterset.parameter_substitution()
-                # Maybe new templates were created
-                if parameterset.has_templates:
-                    LOGGER.debug("Expand parameter templates:\n{0}".format(
-                        "\n".join("    \"{0}\": {1}".format(i, j.value)
-                                  for i, j in parameterset.
-                                  template_parameter_dict.items())))
-                    new_parametersets += \
-                        [new_parameterset for new_parameterset in
-                         parameterset.expand_templates()]
-                    change = True
-                else:
-                    new_parametersets += [parameterset]
-            parametersets = new_parametersets
+        # Without new parametersets all remaining incompatible parameters
+        # must have been updated, otherwise no workpackage can be created
+        if (not new_sets_found) and len(incompatible_parameters) > 0:
+            return new_workpackages
+
+        # Expand templates (lazy, inactive combinations are dropped as soon
+        # as the active condition can be evaluated)
+        parametersets = self._expand_parameterset(
+            global_parameterset, prefilter=not new_sets_found)
 
         # Create workpackages
         for parameterset in parametersets:
@@ -334,9 +327,6 @@ class Step(object):
                                              parents,
                                              incompatible_parameters.copy())
             else:
-                # Check if all incompatible_parameters were updated
-                if len(incompatible_parameters) > 0:
-                    return new_workpackages
                 # Create new workpackage
                 created_workpackages = list()
                 for iteration in range(self.iterations):
@@ -384,6 +374,47 @@ class Step(object):
 
         return new_workpackages
 
+    def _expand_parameterset(self, parameterset, prefilter=False):
+        """Generator to expand all templates of the given parameterset. The
+        resulting parametersets are created one by one in the order of the
+        expansion. If prefilter is set, combinations which can not fulfil
+        the active condition of the step are dropped before their remaining
+        templates are expanded."""
+        parameterset.parameter_substitution()
+        if prefilter and self._preevaluate_active(parameterset) is False:
+            return
+        if parameterset.has_templates:
+            LOGGER.debug("Expand parameter templates:\n{0}".format(
+                "\n".join("    \"{0}\": {1}".format(i, j.value)
+                          for i, j in
+                          parameterset.template_parameter_dict.items())))
+            for new_parameterset in parameterset.expand_templates():
+                for expanded_parameterset in self._expand_parameterset(
+                        new_parameterset, prefilter):
+                    yield expanded_parameterset
+        else:
+            yield parameterset
+
+    def _preevaluate_active(self, parameterset):
+        """Evaluate the active condition using only parameters of the given
+        parameterset which can not change anymore. Return None if the
+        condition can not be evaluated yet."""
+        if self._active in ("true", "false"):
+            return self._active == "true"
+        parameter_dict = dict(
+            [(par.name, par.value) for par in
+             parameterset.constant_parameter_dict.values()
+             if par.mode == "text" and "$" not in par.value and
+             not par.name.startswith("jube_wp_")])
+        active = jube2.util.util.substitution(self._active, parameter_dict)
+        if "$" in active:
+            return None
+        try:
+            return jube2.util.util.eval_bool(active)
+        except Exception:
+            # Errors are reported during the regular workpackage check
+            return None
+
     @property
     def alt_work_dir(self):
         """Return alternativ work directory"""
@@ -22,11 +22,21 @@ from __future__ import (print_function,
                         division)
 
 from collections import deque
+import builtins
+import dis
+import gzip
+import multiprocessing as mp
+import multiprocessing.util as mp_util
+import queue
 import re
+import shlex
+import shutil
 import string
 import operator
 import os.path
 import subprocess
+import tempfile
+import uuid
 import jube2.log
 import time
 import jube2.conf
@@ -36,6 +46,37 @@ import pwd
 
 LOGGER = jube2.log.get_logger(__name__)
 
+# text -> SubstitutionTemplate
+_SUBSTITUTION_CACHE = dict()
+# shell -> ShellCoprocess
+_SHELL_COPROCESSES = dict()
+# (shell, command, working dir) -> stdout of successful shell/perl snippets
+_SCRIPT_RESULT_CACHE = dict()
+# environment the cached script results were created in
+_SCRIPT_RESULT_ENVIRONMENT = dict()
+# (python snippet, compile mode) -> (code object, memo allowed)
+_PYTHON_CODE_CACHE = dict()
+# python snippet -> result of side effect free python snippets
+_PYTHON_RESULT_CACHE = dict()
+
+# global namespace of python snippets
+_PYTHON_GLOBALS = {"__builtins__": builtins, "grp": grp,
+                   "operator": operator, "os": os, "pwd": pwd, "re": re,
+                   "string": string, "subprocess": subprocess, "time": time}
+# builtins whose results only depend on their arguments, python snippets
+# using any other global name or an import are never memorised
+_PYTHON_PURE_BUILTINS = frozenset(
+    ["abs", "all", "any", "ascii", "bin", "bool", "bytes", "chr", "complex",
+     "dict", "divmod", "enumerate", "False", "filter", "float", "format",
+     "frozenset", "hex", "int", "isinstance", "issubclass", "iter", "len",
+     "list", "map", "max", "min", "next", "None", "oct", "ord", "pow",
+     "range", "repr", "reversed", "round", "set", "slice", "sorted", "str",
+     "sum", "True", "tuple", "zip"])
+# opcodes which load a global name
+_PYTHON_GLOBAL_LOAD_OPCODES = frozenset(["LOAD_GLOBAL", "LOAD_NAME"])
+# opcodes which store a name defined by the snippet itself
+_PYTHON_STORE_OPCODES = frozenset(["STORE_GLOBAL", "STORE_NAME"])
+
 
 class Queue:
     '''
@@ -141,6 +182,84 @@ class WorkStat(object):
         self._work_list.put_first(wp)
 
 
+class WorkerPool(object):
+
+    """Long-living process pool, which is shared by all steps of a benchmark
+    run. Each task belongs to a group (the step name) and the number of
+    simultaneously running tasks can be limited per group."""
+
+    def __init__(self, processes):
+        self._processes = max(1, processes)
+        self._pool = None
+        self._finished = queue.Queue()
+        self._running = dict()
+
+    @property
+    def processes(self):
+        """Return number of worker processes"""
+        return self._processes
+
+    def running(self, group=None):
+        """Return number of running tasks (of the given group)"""
+        if group is None:
+            return sum(self._running.values())
+        return self._running.get(group, 0)
+
+    def has_free_slot(self, group, limit):
+        """Check if another task of the given group can be started without
+        exceeding the group limit or the number of worker processes"""
+        return (self.running() < self._processes) and \
+            (self.running(group) < limit)
+
+    def submit(self, group, func, args=()):
+        """Start func(*args) inside of a worker process"""
+        # Worker processes are only forked once per benchmark run
+        if self._pool is None:
+            self._pool = mp.Pool(processes=self._processes)
+        self._running[group] = self.running(group) + 1
+        self._pool.apply_async(
+            func, args,
+            callback=lambda value: self._finished.put((group, value, None)),
+            error_callback=lambda error: self._finished.put(
+                (group, None, error)))
+
+    def _task_finished(self, finished):
+        """Update running counter for a finished task"""
+        self._running[finished[0]] -= 1
+        return finished
+
+    def poll(self):
+        """Return (group, return value, exception) tuples of all tasks
+        which are finished, without waiting"""
+        finished = list()
+        while True:
+            try:
+                finished.append(self._task_finished(
+                    self._finished.get_nowait()))
+            except queue.Empty:
+                return finished
+
+    def wait(self):
+        """Wait for the next task to finish and return its
+        (group, return value, exception) tuple"""
+        return self._task_finished(self._finished.get())
+
+    def close(self):
+        """Wait for all worker processes to exit"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def terminate(self):
+        """Stop all worker processes immediately"""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._running = dict()
+
+
 def valid_tags(tag_string, tags):
     """Check if tag_string contains only valid tags"""
     if tags is None:
@@ -171,6 +290,17 @@ def valid_tags(tag_string, tags):
         return True
 
 
+def unique_list(items):
+    """Return list of items without duplicates, keep first occurrences"""
+    found = set()
+    result = list()
+    for item in items:
+        if item not in found:
+            found.add(item)
+            result.append(item)
+    return result
+
+
 def get_current_id(base_dir):
     """Return the highest id found in directory 'base_dir'."""
     try:
@@ -207,8 +337,96 @@ def expand_dollar_count(text):
     return re.sub(r"(^(?=\$)|[^$])((?:\$\$)+?)((?:\${3})?(?:[^$]|$))", r"\1\2\2\3", text)
 
 
+class SubstitutionTemplate(object):
+
+    """Text which was split once into literal parts and parameter
+    references to substitute it repeatedly. Texts containing $$ and
+    parameter values containing $ need the full substitution process and
+    are not handled by the template."""
+
+    __slots__ = ("_text", "_segments")
+
+    def __init__(self, text):
+        self._text = text
+        # [literal, (name, source), literal, (name, source), ..., literal]
+        self._segments = None
+        if "$$" in text:
+            return
+        segments = list()
+        pos = 0
+        for match in string.Template.pattern.finditer(text):
+            name = match.group("named") or match.group("braced")
+            if name is None:
+                # single $ which is not followed by a name, a following
+                # substitution could complete a ${name}
+                if text[match.end():match.end() + 1] == "{":
+                    return
+                continue
+            segments.append(text[pos:match.start()])
+            segments.append((name, match.group()))
+            pos = match.end()
+        segments.append(text[pos:])
+        # Single $ in front of whitespace will be kept as $$
+        self._segments = [re.sub(r"\$(?=([\s]|$))", "$$", segment)
+                          if not isinstance(segment, tuple) else segment
+                          for segment in segments]
+
+    @property
+    def text(self):
+        """Return source text"""
+        return self._text
+
+    def substitute(self, substitution_dict):
+        """Substitute the template using the given dictionary. Return None
+        if the full substitution process is needed."""
+        segments = self._segments
+        if segments is None:
+            return None
+        parts = [segments[0]]
+        for i in range(1, len(segments), 2):
+            name, source = segments[i]
+            if name in substitution_dict:
+                value = str(substitution_dict[name])
+                if "$" in value:
+                    return None
+                parts.append(value)
+            else:
+                # An unknown name directly followed by a substituted value
+                # could form a new name
+                if segments[i + 1] == "" and i + 2 < len(segments) and \
+                        source[1] != "{":
+                    return None
+                parts.append(source)
+            parts.append(segments[i + 1])
+        return "".join(parts)
+
+
+def substitution_template(text):
+    """Return the SubstitutionTemplate of the given text, already created
+    templates are reused"""
+    template = _SUBSTITUTION_CACHE.get(text)
+    if template is None:
+        if len(_SUBSTITUTION_CACHE) >= \
+                jube2.conf.MAX_SUBSTITUTION_CACHE_SIZE:
+            _SUBSTITUTION_CACHE.clear()
+        template = SubstitutionTemplate(text)
+        _SUBSTITUTION_CACHE[text] = template
+    return template
+
+
 def substitution(text, substitution_dict):
     """Substitute templates given by parameter_dict inside of text"""
+    if "$" not in text:
+        return text
+    result = substitution_template(text).substitute(substitution_dict)
+    if result is None:
+        result = _substitution(text, substitution_dict)
+    return result
+
+
+def _substitution(text, substitution_dict):
+    """Substitute templates given by parameter_dict inside of text, handles
+    all kinds of $ combinations"""
     changed = True
     count = 0
     # All values must be string values (handle Python 2 separatly)
@@ -279,15 +497,30 @@ def convert_type(value_type, value, stop=True):
 def script_evaluation(cmd, script_type):
     """cmd will be evaluated with given script language"""
     if script_type == "python":
+        if cmd in _PYTHON_RESULT_CACHE:
+            return _PYTHON_RESULT_CACHE[cmd]
+        code = None
         if "return " not in cmd:
             try:
-                return str(eval(cmd))
-            except:
+                code, memo_allowed = _python_code(cmd, "eval")
+            except (SyntaxError, ValueError):
                 pass
-        loc = {}
-        i = cmd.rfind("return ")
-        exec(cmd[:i] + cmd[i:].replace("return ", "return_value = "), globals(), loc)
-        return str(loc["return_value"])
+        if code is not None:
+            result = str(eval(code, dict(_PYTHON_GLOBALS)))
+        else:
+            loc = {}
+            i = cmd.rfind("return ")
+            code, memo_allowed = _python_code(
+                cmd[:i] + cmd[i:].replace("return ", "return_value = "),
+                "exec")
+            exec(code, dict(_PYTHON_GLOBALS), loc)
+            result = str(loc["return_value"])
+        if memo_allowed:
+            if len(_PYTHON_RESULT_CACHE) >= \
+                    jube2.conf.MAX_SCRIPT_RESULT_CACHE_SIZE:
+                _PYTHON_RESULT_CACHE.clear()
+            _PYTHON_RESULT_CACHE[cmd] = result
+        return result
     elif script_type in ["perl", "shell"]:
         if script_type == "perl":
             cmd = "perl -e \"print " + cmd + "\""
@@ -298,13 +531,22 @@ def script_evaluation(cmd, script_type):
             alt_shell = os.environ["JUBE_EXEC_SHELL"].strip()
             if len(alt_shell) > 0:
                 shell = alt_shell
-        sub = subprocess.Popen([shell, "-c", cmd], stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE, shell=False)
 
-        stdout, stderr = sub.communicate()
+        # If enabled, identical snippets are only evaluated once within the
+        # same environment
+        use_cache = jube2.conf.SHELL_RESULT_CACHE
+        if use_cache:
+            if _SCRIPT_RESULT_ENVIRONMENT != os.environ:
+                _SCRIPT_RESULT_CACHE.clear()
+                _SCRIPT_RESULT_ENVIRONMENT.clear()
+                _SCRIPT_RESULT_ENVIRONMENT.update(os.environ)
+            key = (shell, cmd, os.getcwd())
+            if key in _SCRIPT_RESULT_CACHE:
+                return _SCRIPT_RESULT_CACHE[key]
+
+        errorcode, stdout, stderr = _run_shell_command(shell, cmd)
         stdout = stdout.decode(errors="ignore")
         # Check command execution error code
-        errorcode = sub.wait()
         if errorcode != 0:
             raise RuntimeError(stderr)
         else:
@@ -317,9 +559,152 @@ def script_evaluation(cmd, script_type):
                                  .format(cmd, stderr))
                 except UnicodeDecodeError:
                     pass
+            if use_cache:
+                if len(_SCRIPT_RESULT_CACHE) >= \
+                        jube2.conf.MAX_SCRIPT_RESULT_CACHE_SIZE:
+                    _SCRIPT_RESULT_CACHE.clear()
+                _SCRIPT_RESULT_CACHE[key] = stdout
             return stdout
 
 
+def _python_code(cmd, mode):
+    """Return the compiled python snippet cmd (mode "eval" or "exec") and
+    whether its result only depends on cmd itself"""
+    key = (cmd, mode)
+    if key not in _PYTHON_CODE_CACHE:
+        code = compile(cmd, "<string>", mode)
+        if len(_PYTHON_CODE_CACHE) >= jube2.conf.MAX_PYTHON_CODE_CACHE_SIZE:
+            _PYTHON_CODE_CACHE.clear()
+        _PYTHON_CODE_CACHE[key] = (code, _side_effect_free(code))
+    return _PYTHON_CODE_CACHE[key]
+
+
+def _side_effect_free(code):
+    """Check if code does not import anything and only uses global names
+    which are defined by the snippet itself or are pure builtins"""
+    stored_names = set()
+    loaded_names = set()
+    code_objects = [code]
+    while code_objects:
+        current = code_objects.pop()
+        for instruction in dis.get_instructions(current):
+            if instruction.opname.startswith("IMPORT_"):
+                return False
+            elif instruction.opname in _PYTHON_GLOBAL_LOAD_OPCODES:
+                loaded_names.add(instruction.argval)
+            elif instruction.opname in _PYTHON_STORE_OPCODES:
+                stored_names.add(instruction.argval)
+        # Attributes like __class__ allow to reach any state
+        if any(name.startswith("__") for name in current.co_names):
+            return False
+        # Check nested code of functions, lambdas and comprehensions
+        code_objects += [const for const in current.co_consts
+                         if hasattr(const, "co_names")]
+    return loaded_names <= (_PYTHON_PURE_BUILTINS | stored_names)
+
+
+class ShellCoprocess(object):
+
+    """A persistent shell process. Commands are send through a pipe and run
+    inside of a subshell, so that they cannot change the state of the
+    persistent shell, but no new shell must be started for each of them.
+    The output of a command is read from a FIFO until all processes started
+    by the command closed it."""
+
+    def __init__(self, shell):
+        self._pid = os.getpid()
+        self._cwd = os.getcwd()
+        self._environment = dict(os.environ)
+        self._marker = "JUBE_END_" + uuid.uuid4().hex
+        self._end_regex = re.compile(
+            self._marker.encode() + b" (\\d+)\n\\Z")
+        self._tmp_dir = tempfile.mkdtemp(prefix="jube_")
+        self._stdout_filename = os.path.join(self._tmp_dir, "stdout")
+        self._stderr_filename = os.path.join(self._tmp_dir, "stderr")
+        os.mkfifo(self._stdout_filename)
+        self._process = subprocess.Popen(
+            [shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, shell=False)
+        # Worker processes of a multiprocessing pool do not run atexit
+        # handlers, but multiprocessing finalizers
+        self._finalizer = mp_util.Finalize(
+            self, ShellCoprocess._cleanup,
+            args=(self._pid, self._process, self._tmp_dir), exitpriority=0)
+
+    @property
+    def usable(self):
+        """The coprocess is running and was started by the current process
+        using the current environment and working directory"""
+        return self._pid == os.getpid() and \
+            self._process.poll() is None and \
+            self._cwd == os.getcwd() and self._environment == os.environ
+
+    def run(self, cmd):
+        """Run cmd and return its error code, stdout and stderr"""
+        self._process.stdin.write((
+            "__jube_cmd={0}\n"
+            "( eval \"$__jube_cmd\" ) </dev/null >{1} 2>{2}\n"
+            "printf '%s %d\\n' {3} \"$?\"\n").format(
+                shlex.quote(cmd), shlex.quote(self._stdout_filename),
+                shlex.quote(self._stderr_filename),
+                self._marker).encode())
+        self._process.stdin.flush()
+        # Like communicate(), read until background processes started by
+        # the command closed their stdout as well
+        with open(self._stdout_filename, "rb") as stdout_file:
+            stdout = stdout_file.read()
+        match = self._end_regex.match(self._process.stdout.readline())
+        if match is None:
+            raise IOError("Shell process terminated unexpectedly")
+        with open(self._stderr_filename, "rb") as stderr_file:
+            stderr = stderr_file.read()
+        return int(match.group(1)), stdout, stderr
+
+    def close(self):
+        """Stop the shell process"""
+        self._finalizer()
+
+    @staticmethod
+    def _cleanup(pid, process, tmp_dir):
+        """Stop the shell process and remove its temporary files, if they
+        were created by the current process"""
+        if pid != os.getpid():
+            return
+        try:
+            process.stdin.close()
+            process.wait()
+        except (IOError, OSError):
+            pass
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _run_shell_command(shell, cmd):
+    """Run cmd using the given shell and return its error code, stdout and
+    stderr. A persistent shell process is used if possible."""
+    # $$ (and $BASHPID) would show the pid of the persistent shell
+    if jube2.conf.SHELL_COPROCESS and "$$" not in cmd and \
+            "BASHPID" not in cmd:
+        coprocess = _SHELL_COPROCESSES.get(shell)
+        try:
+            if coprocess is None or not coprocess.usable:
+                if coprocess is not None:
+                    coprocess.close()
+                coprocess = ShellCoprocess(shell)
+                _SHELL_COPROCESSES[shell] = coprocess
+            return coprocess.run(cmd)
+        except (IOError, OSError) as exception:
+            LOGGER.debug("Shell process cannot be used: {0}".format(
+                str(exception)))
+            if coprocess is not None:
+                coprocess.close()
+            _SHELL_COPROCESSES.pop(shell, None)
+
+    sub = subprocess.Popen([shell, "-c", cmd], stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE, shell=False)
+    stdout, stderr = sub.communicate()
+    return sub.wait(), stdout, stderr
+
+
 def eval_bool(cmd):
     """Evaluate a bool expression"""
     if cmd.lower() == "true":
@@ -328,7 +713,8 @@ def eval_bool(cmd):
         return False
     else:
         try:
-            return bool(eval(cmd))
+            return bool(eval(_python_code(cmd, "eval")[0],
+                             dict(_PYTHON_GLOBALS)))
         except SyntaxError as se:
             raise ValueError(
                 ("\"{0}\" could not be evaluated and handled as boolean "
@@ -401,50 +787,64 @@ def read_timestamps(path):
     return timestamps
 
 
+def compressed_alternative(path):
+    """Return path, or the path of its gzip compressed variant if only the
+    compressed file exists"""
+    if (not os.path.exists(path)) and \
+            os.path.isfile(path + jube2.conf.COMPRESSED_FILE_SUFFIX):
+        return path + jube2.conf.COMPRESSED_FILE_SUFFIX
+    return path
+
+
+def open_binary(path):
+    """Open file for binary reading, gzip compressed files are decompressed
+    transparently"""
+    file_ptr = open(path, "rb")
+    if file_ptr.read(2) == b"\x1f\x8b":
+        file_ptr.close()
+        return gzip.open(path, "rb")
+    file_ptr.seek(0)
+    return file_ptr
+
+
 def resolve_depend(depend_dict):
     """Generate a serialization of dependent steps.
 
     Return a list with a possible order of execution.
     """
-    def find_next(dependencies, finished):
-        """Returns the next possible items to be processed and remainder.
-
-        dependencies  Dictionary containing the dependencies
-        finished      Set which is already processed
-        """
-        possible = set()
-        remain = dict()
-
-        for key, val in dependencies.items():
-            if val.issubset(finished):
-                possible.add(key)
-            else:
-                remain[key] = val
-
-        possible.difference_update(finished)
-        # no advance
-        if dependencies and not possible:
-            unresolved_steps = set(dependencies) - finished
-            unresolved_dependencies = set()
-            for step in unresolved_steps:
-                unresolved_dependencies.update(depend_dict[step] -
-                                               finished)
-            infostr = ("unresolved steps: {0}".
-                       format(",".join(unresolved_steps)) + "\n" +
-                       "unresolved dependencies: {0}".
-                       format(",".join(unresolved_dependencies)))
-            LOGGER.warning(infostr)
-
-        return (possible, remain)
-
-    finished = set()
-    work_list = list()
+    # Number of open dependencies and reverse dependencies of each item
+    open_count = dict()
+    dependents = dict([(key, list()) for key in depend_dict])
+    for key, val in depend_dict.items():
+        open_count[key] = len(val)
+        for dependency in val:
+            if dependency in dependents:
+                dependents[dependency].append(key)
 
-    work, remain = find_next(depend_dict, finished)
+    work_list = list()
+    work = [key for key, count in open_count.items() if count == 0]
     while work:
-        work_list += list(work)
-        finished.update(work)
-        work, remain = find_next(remain, finished)
+        work_list += work
+        next_work = list()
+        for key in work:
+            for dependent in dependents[key]:
+                open_count[dependent] -= 1
+                if open_count[dependent] == 0:
+                    next_work.append(dependent)
+        work = next_work
+
+    # no advance
+    if len(work_list) < len(depend_dict):
+        finished = set(work_list)
+        unresolved_steps = set(depend_dict) - finished
+        unresolved_dependencies = set()
+        for step in unresolved_steps:
+            unresolved_dependencies.update(depend_dict[step] - finished)
+        infostr = ("unresolved steps: {0}".
+                   format(",".join(unresolved_steps)) + "\n" +
+                   "unresolved dependencies: {0}".
+                   format(",".join(unresolved_dependencies)))
+        LOGGER.warning(infostr)
 
     return work_list
 
@@ -0,0 +1,305 @@
+# JUBE Benchmarking Environment
+# Copyright (C) 2008-2023
+# Forschungszentrum Juelich GmbH, Juelich Supercomputing Centre
+# http://www.fz-juelich.de/jsc/jube
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Result warehouse handling"""
+
+from __future__ import (print_function,
+                        unicode_literals,
+                        division)
+
+import contextlib
+import os
+import sqlite3
+import jube2.conf
+import jube2.log
+import jube2.util.output
+import jube2.util.util
+
+LOGGER = jube2.log.get_logger(__name__)
+
+
+def _quote(identifier):
+    """Quote a SQL identifier"""
+    return "\"{0}\"".format(identifier.replace("\"", "\"\""))
+
+
+def _result_table(result_name):
+    """Return the quoted table name of the given result"""
+    return _quote("jube_result_" + result_name)
+
+
+def _table_column(position):
+    """Return the table column name of a result column. Result column names
+    are not used directly, because SQLite handles them case insensitive."""
+    return "c{0}".format(position)
+
+
+def _column_name(key):
+    """Return the column name of a result key"""
+    if hasattr(key, "resulting_name"):
+        return key.resulting_name
+    return key.name
+
+
+def display_value(value, format_string=None):
+    """Return the text representation of a stored value"""
+    if value is None:
+        return ""
+    if (format_string is not None) and (type(value) in (int, float)):
+        try:
+            return jube2.util.output.format_value(format_string, value)
+        except (ValueError, TypeError):
+            pass
+    return str(value)
+
+
+def _stored_value(value, format_string=None):
+    """Return the value which is stored for a result entry. Numbers are stored
+    as numbers if their text representation can be restored, to allow
+    numerical filtering and sorting."""
+    if (value is None) or (value == ""):
+        return None
+    if type(value) is not str:
+        return value
+    for convert in (int, float):
+        try:
+            number = convert(value)
+        except ValueError:
+            continue
+        # NaN cannot be stored by SQLite
+        if (number == number) and \
+                (display_value(number, format_string) == value):
+            return number
+    return value
+
+
+def benchmark_fingerprint(benchmark_folder):
+    """Return a fingerprint of the state of the given benchmark directory. It
+    changes if the benchmark was continued (timestamps file), analysed or
+    updated."""
+    fingerprint = list()
+    try:
+        with open(os.path.join(benchmark_folder,
+                               jube2.conf.TIMESTAMPS_INFO)) as timestamps:
+            fingerprint.append(timestamps.read().strip())
+    except IOError:
+        fingerprint.append("")
+    for filename in (jube2.conf.CONFIGURATION_FILENAME,
+                     jube2.conf.ANALYSE_FILENAME,
+                     jube2.conf.ANALYSE_DB_FILENAME):
+        try:
+            stat = os.stat(os.path.join(benchmark_folder, filename))
+            fingerprint.append("{0}:{1}".format(stat.st_mtime_ns,
+                                                stat.st_size))
+        except OSError:
+            fingerprint.append("")
+    return "|".join(fingerprint)
+
+
+class Warehouse(object):
+
+    """Local store of the result data of all benchmarks of a benchmark
+    directory. Each benchmark is only stored once and can be replaced if it
+    was changed. Every result is stored in its own table, which contains one
+    column per result column, the benchmark id and the row number."""
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._con = sqlite3.connect(filename, isolation_level=None)
+        for pragma in jube2.conf.RESULT_DATABASE_PRAGMAS:
+            self._con.execute("PRAGMA " + pragma)
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS jube_benchmarks (id INTEGER " +
+            "PRIMARY KEY, name TEXT, directory TEXT, fingerprint TEXT)")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS jube_columns (result TEXT, " +
+            "position INTEGER, name TEXT, format TEXT, " +
+            "PRIMARY KEY (result, name))")
+
+    def close(self):
+        """Close the warehouse"""
+        self._con.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """All changes inside of this context are committed together when
+        the context is left without an error, otherwise none of them"""
+        self._con.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._con.execute("ROLLBACK")
+            raise
+        self._con.execute("COMMIT")
+
+    def fingerprint(self, benchmark_id):
+        """Return the fingerprint of the stored benchmark or None if the
+        benchmark was not stored"""
+        row = self._con.execute(
+            "SELECT fingerprint FROM jube_benchmarks WHERE id = ?",
+            (benchmark_id,)).fetchone()
+        return None if row is None else row[0]
+
+    @property
+    def benchmark_ids(self):
+        """Return the sorted ids of all stored benchmarks"""
+        return [row[0] for row in self._con.execute(
+            "SELECT id FROM jube_benchmarks ORDER BY id")]
+
+    @property
+    def result_names(self):
+        """Return the names of all stored results"""
+        return [row[0] for row in self._con.execute(
+            "SELECT result FROM jube_columns GROUP BY result " +
+            "ORDER BY MIN(rowid)")]
+
+    def columns(self, result_name):
+        """Return list of (name, format, position) of all columns of the
+        given result"""
+        return self._con.execute(
+            "SELECT name, format, position FROM jube_columns WHERE " +
+            "result = ? ORDER BY position", (result_name,)).fetchall()
+
+    def _delete_benchmark(self, benchmark_id):
+        """Delete all data of the given benchmark"""
+        for result_name in self.result_names:
+            self._con.execute(
+                "DELETE FROM {0} WHERE jube_benchmark_id = ?".format(
+                    _result_table(result_name)), (benchmark_id,))
+        self._con.execute("DELETE FROM jube_benchmarks WHERE id = ?",
+                          (benchmark_id,))
+
+    def remove(self, benchmark_id):
+        """Remove the given benchmark from the warehouse"""
+        with self._transaction():
+            self._delete_benchmark(benchmark_id)
+
+    def _add_columns(self, result_name, columns):
+        """Create result table and add missing (name, format) columns. Return
+        the table column names of the given columns."""
+        table = _result_table(result_name)
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS {0} (jube_benchmark_id INTEGER, "
+            "jube_row INTEGER)".format(table))
+        self._con.execute(
+            "CREATE INDEX IF NOT EXISTS {0} ON {1} (jube_benchmark_id)"
+            .format(_quote("jube_index_" + result_name), table))
+        positions = dict((name, position) for name, _, position in
+                         self.columns(result_name))
+        table_columns = list()
+        for name, format_string in columns:
+            if name not in positions:
+                positions[name] = len(positions)
+                self._con.execute("ALTER TABLE {0} ADD COLUMN {1}".format(
+                    table, _table_column(positions[name])))
+                self._con.execute(
+                    "INSERT INTO jube_columns VALUES (?, ?, ?, ?)",
+                    (result_name, positions[name], name, format_string))
+            else:
+                self._con.execute(
+                    "UPDATE jube_columns SET format = ? WHERE result = ? " +
+                    "AND name = ?", (format_string, result_name, name))
+            table_columns.append(_table_column(positions[name]))
+        return table_columns
+
+    def ingest(self, benchmark):
+        """Store all results of the given benchmark. Existing data of this
+        benchmark is replaced."""
+        result_data_list = list()
+        for result_name in benchmark.results_order:
+            result = benchmark.results[result_name]
+            result_data_list.append(
+                result.create_result_data(None, None, None))
+        # A missing analyse is created together with the result data,
+        # therefore the fingerprint is taken afterwards
+        fingerprint = benchmark_fingerprint(benchmark.bench_dir)
+
+        with self._transaction():
+            self._delete_benchmark(benchmark.id)
+            for result_data in result_data_list:
+                data_dict = result_data.data_dict
+                columns = [(_column_name(key), getattr(key, "format", None))
+                           for key in data_dict]
+                table_columns = self._add_columns(result_data.name, columns)
+                rows = list()
+                for row_number, row in enumerate(zip(*data_dict.values())):
+                    rows.append([benchmark.id, row_number] +
+                                [_stored_value(value, columns[i][1])
+                                 for i, value in enumerate(row)])
+                self._con.executemany(
+                    "INSERT INTO {0} (jube_benchmark_id, jube_row, {1}) "
+                    "VALUES ({2})".format(
+                        _result_table(result_data.name),
+                        ", ".join(table_columns),
+                        ", ".join("?" * (len(columns) + 2))), rows)
+            self._con.execute(
+                "INSERT INTO jube_benchmarks VALUES (?, ?, ?, ?)",
+                (benchmark.id, benchmark.name,
+                 os.path.abspath(benchmark.bench_dir), fingerprint))
+
+    def query(self, result_name, benchmark_ids=None, select=None,
+              condition=None, sort_names=None, reverse=False):
+        """Return the (name, format) columns and the rows of the given result.
+        Each row starts with the benchmark id. condition can contain a SQL
+        expression to filter the rows, columns are referenced by $name."""
+        columns = self.columns(result_name)
+        table_columns = dict((name, _table_column(position))
+                             for name, _, position in columns)
+        if select is not None:
+            for name in select:
+                if name not in table_columns:
+                    LOGGER.warning("The result table does not contain a "
+                                   "column with the name '{0}'. This name "
+                                   "will be ignored for selection."
+                                   .format(name))
+            columns = [column for column in columns if column[0] in select]
+        table = _result_table(result_name)
+
+        conditions = list()
+        parameters = list()
+        if benchmark_ids is not None:
+            conditions.append("jube_benchmark_id IN ({0})".format(
+                ", ".join("?" * len(benchmark_ids))))
+            parameters += benchmark_ids
+        if condition is not None:
+            conditions.append("({0})".format(jube2.util.util.substitution(
+                condition, table_columns)))
+
+        order = list()
+        for name in sort_names or list():
+            if name not in table_columns:
+                raise ValueError("Unknown column \"{0}\" in result \"{1}\""
+                                 .format(name, result_name))
+            # Indices are created on demand for all sorting columns
+            self._con.execute(
+                "CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})".format(
+                    _quote("jube_index_{0}_{1}".format(
+                        result_name, table_columns[name])), table,
+                    table_columns[name]))
+            order.append(table_columns[name])
+        order.append("jube_benchmark_id" + (" DESC" if reverse else ""))
+        order.append("jube_row")
+
+        query = "SELECT jube_benchmark_id{0} FROM {1}".format(
+            "".join(", " + table_columns[column[0]] for column in columns),
+            table)
+        if len(conditions) > 0:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY " + ", ".join(order)
+        LOGGER.debug(query)
+        return ([(name, format_string) for name, format_string, _ in columns],
+                self._con.execute(query, parameters).fetchall())
@@ -43,11 +43,17 @@ class Workpackage(object):
     its given parameterset.
     """
 
+    __slots__ = ("_id", "_benchmark", "_step", "_local_parameter_names",
+                 "_parameterset", "_iteration", "_parents", "_children",
+                 "_iteration_siblings", "_queued", "_env", "_cycle",
+                 "_workpackage_dir_caching_enabled", "_workpackage_dir_cache",
+                 "_state_cache", "_parameter_dict_cache")
+
     # class based counter for unique id creation
     id_counter = 0
 
     def __init__(self, benchmark, step, local_parameter_names, parameterset,
-                 workpackage_id=None, iteration=0, cycle=0):
+                 workpackage_id=None, iteration=0, cycle=0, env=None):
         # set id
         if workpackage_id is None:
             self._id = Workpackage.id_counter
@@ -64,10 +70,14 @@ class Workpackage(object):
         self._children = list()
         self._iteration_siblings = set()
         self._queued = False
-        self._env = dict(os.environ)
+        # Copying a plain dict is much cheaper than copying os.environ
+        self._env = dict(os.environ if env is None else env)
         self._cycle = cycle
         self._workpackage_dir_caching_enabled = False
         self._workpackage_dir_cache = None
+        self._state_cache = None
+        # (parameterset version, parameter dict)
+        self._parameter_dict_cache = None
 
     def etree_repr(self):
         """Return etree object representation"""
@@ -124,11 +134,17 @@ class Workpackage(object):
 
     @property
     def parameter_dict(self):
-        """get all available parameter inside a dict"""
-        # Collect parameter for substitution
-        parameter = dict([[par.name, par.value] for par in
-                          self._parameterset.constant_parameter_dict.values()])
-        return parameter
+        """get all available parameter inside a dict, the dict is reused
+        until the parameterset changes and must not be modified"""
+        version = self._parameterset.version
+        if self._parameter_dict_cache is None or \
+                self._parameter_dict_cache[0] != version:
+            # Collect parameter for substitution
+            parameter = dict(
+                [[par.name, par.value] for par in
+                 self._parameterset.constant_parameter_dict.values()])
+            self._parameter_dict_cache = (version, parameter)
+        return self._parameter_dict_cache[1]
 
     @property
     def env(self):
@@ -154,6 +170,69 @@ class Workpackage(object):
         """Enable workpackage dir cache"""
         self._workpackage_dir_caching_enabled = True
         self._workpackage_dir_cache = None
+        self._state_cache = None
+
+    @property
+    def _state(self):
+        """Return cached workpackage state, read it from the marker files
+        if needed"""
+        if self._state_cache is None:
+            self.refresh_state()
+        return self._state_cache
+
+    def refresh_state(self):
+        """Reload workpackage state from the marker files inside of the
+        workpackage directory"""
+        try:
+            dir_entries = os.listdir(self.workpackage_dir)
+        except OSError:
+            self._reset_state()
+            return
+        done_files = [jube2.conf.WORKPACKAGE_DONE_FILENAME]
+        if jube2.conf.DEBUG_MODE:
+            done_files.append(jube2.conf.WORKPACKAGE_DONE_FILENAME + "_DEBUG")
+        operation_prefix = "wp_{0}_".format(
+            jube2.conf.WORKPACKAGE_DONE_FILENAME)
+        state = {"started": True, "done": False, "error": False,
+                 "operations": set()}
+        for entry in dir_entries:
+            if entry in done_files:
+                state["done"] = True
+            elif entry == jube2.conf.WORKPACKAGE_ERROR_FILENAME:
+                state["error"] = True
+            elif entry.startswith(operation_prefix):
+                number = entry[len(operation_prefix):]
+                if jube2.conf.DEBUG_MODE and number.endswith("_DEBUG"):
+                    number = number[:-len("_DEBUG")]
+                if number.isdigit():
+                    state["operations"].add(int(number))
+        self._state_cache = state
+
+    def _reset_state(self, started=False):
+        """Reset state cache to a workpackage without any marker files"""
+        self._state_cache = {"started": started, "done": False,
+                             "error": False, "operations": set()}
+
+    @staticmethod
+    def refresh_states(workpackages):
+        """Reload the state of all given workpackages. Workpackages which
+        were not started yet are found by a single scan of the benchmark
+        directory."""
+        bench_dir_entries = dict()
+        for workpackage in workpackages:
+            bench_dir = workpackage.benchmark.bench_dir
+            if bench_dir not in bench_dir_entries:
+                try:
+                    bench_dir_entries[bench_dir] = set(os.listdir(bench_dir))
+                except OSError:
+                    bench_dir_entries[bench_dir] = set()
+            workpackage_dir = workpackage.workpackage_dir
+            if (os.path.dirname(workpackage_dir) != bench_dir) or \
+                    (os.path.basename(workpackage_dir) in
+                     bench_dir_entries[bench_dir]):
+                workpackage.refresh_state()
+            else:
+                workpackage._reset_state()
 
     @property
     def active(self):
@@ -169,12 +248,7 @@ class Workpackage(object):
     @property
     def done(self):
         """Workpackage done?"""
-        done_file = os.path.join(self.workpackage_dir,
-                                 jube2.conf.WORKPACKAGE_DONE_FILENAME)
-        exist = os.path.exists(done_file)
-        if jube2.conf.DEBUG_MODE:
-            exist = exist or os.path.exists(done_file + "_DEBUG")
-        return exist
+        return self._state["done"]
 
     @done.setter
     def done(self, set_done):
@@ -187,17 +261,21 @@ class Workpackage(object):
             fout = open(done_file, "w")
             fout.write(jube2.util.util.now_str())
             fout.close()
+            self._state["done"] = True
             self._remove_operation_info_files()
         else:
             if os.path.exists(done_file):
                 os.remove(done_file)
+            if jube2.conf.DEBUG_MODE:
+                # A non debug done file can still exist
+                self._state_cache = None
+            else:
+                self._state["done"] = False
 
     @property
     def error(self):
         """Workpackage error?"""
-        error_file = os.path.join(self.workpackage_dir,
-                                  jube2.conf.WORKPACKAGE_ERROR_FILENAME)
-        return os.path.exists(error_file)
+        return self._state["error"]
 
     def set_error(self, set_error, msg=""):
         """Set/reset Workpackage error"""
@@ -210,6 +288,7 @@ class Workpackage(object):
         else:
             if os.path.exists(error_file):
                 os.remove(error_file)
+        self._state["error"] = bool(set_error)
 
     @property
     def queued(self):
@@ -224,7 +303,7 @@ class Workpackage(object):
     @property
     def started(self):
         """Workpackage started?"""
-        return os.path.exists(self.workpackage_dir)
+        return self._state["started"]
 
     def operation_done_but_pending(self, operation_number):
         """Check if an operation was executed, but the result is still
@@ -259,15 +338,12 @@ class Workpackage(object):
                                      jube2.conf.WORKPACKAGE_DONE_FILENAME,
                                      operation_number))
         if set_done is None:
-            exist = os.path.exists(done_file)
-            if jube2.conf.DEBUG_MODE:
-                exist = exist or os.path.exists(done_file + "_DEBUG")
-            return exist
+            return operation_number in self._state["operations"]
         else:
             if jube2.conf.DEBUG_MODE:
                 done_file = done_file + "_DEBUG"
-            elif ((set_done and not os.path.exists(done_file)) or
-                  (not set_done and os.path.exists(done_file))):
+            elif set_done != (operation_number in
+                              self._state["operations"]):
                 jube2.util.util.update_timestamps(
                     os.path.join(self._benchmark.bench_dir,
                                  jube2.conf.TIMESTAMPS_INFO),
@@ -275,9 +351,15 @@ class Workpackage(object):
             if set_done:
                 fout = open(done_file, "w")
                 fout.close()
+                self._state["operations"].add(operation_number)
             else:
                 if os.path.exists(done_file):
                     os.remove(done_file)
+                if jube2.conf.DEBUG_MODE:
+                    # A non debug operation file can still exist
+                    self._state_cache = None
+                else:
+                    self._state["operations"].discard(operation_number)
             return set_done
 
     def _remove_operation_info_files(self):
@@ -290,6 +372,7 @@ class Workpackage(object):
         for children in self.children:
             children.remove(remove_config_from_benchmark=True)
         shutil.rmtree(self.workpackage_dir, ignore_errors=True)
+        self._state_cache = None
 
         # Remove shared folder if all workpackages of the current step were
         # removed
@@ -309,6 +392,7 @@ class Workpackage(object):
     def add_parent(self, workpackage):
         """Add a parent Workpackage"""
         self._parents.append(workpackage)
+        self._benchmark.invalidate_workpackage_graph()
 
     @property
     def parameterset(self):
@@ -323,6 +407,7 @@ class Workpackage(object):
     def add_children(self, workpackage):
         """Add a children workpackage"""
         self._children.append(workpackage)
+        self._benchmark.invalidate_workpackage_graph()
 
     @property
     def local_parameterset(self):
@@ -334,12 +419,8 @@ class Workpackage(object):
 
     @property
     def parent_history(self):
-        """Create a list of all parents in the history of this workpackage"""
-        history = list()
-        for parent in self._parents:
-            history += parent.parent_history
-        history += self._parents
-        return history
+        """Return a list of all parents in the history of this workpackage"""
+        return list(self._benchmark.workpackage_ancestors(self))
 
     @property
     def benchmark(self):
@@ -348,12 +429,8 @@ class Workpackage(object):
 
     @property
     def children_future(self):
-        """Create a list of all children in the future of this workpackage"""
-        future = list()
-        future += self._children
-        for child in self._children:
-            future += child.children_future
-        return future
+        """Return a list of all children in the future of this workpackage"""
+        return list(self._benchmark.workpackage_descendants(self))
 
     @property
     def id(self):
@@ -524,6 +601,7 @@ class Workpackage(object):
                                    .format(self.workpackage_dir))
             os.mkdir(self.workpackage_dir)
             os.mkdir(self.work_dir)
+            self._reset_state(started=True)
 
         # Create symbolic link to parent workpackage folder
         for parent in self._parents:
@@ -565,12 +643,9 @@ class Workpackage(object):
                 self._workpackage_dir_cache is None:
             suffix = self.step.suffix
             if suffix != "":
-                # Collect parameter for substitution
-                parameter = \
-                    dict([[par.name, par.value] for par in
-                          self._parameterset.constant_parameter_dict.values()])
                 # Parameter substitution
-                suffix = jube2.util.util.substitution(suffix, parameter)
+                suffix = jube2.util.util.substitution(suffix,
+                                                      self.parameter_dict)
                 suffix = "_" + os.path.expandvars(os.path.expanduser(suffix))
             path = "{path}_{step_name}{suffix}".format(
                 path=jube2.util.util.id_dir(
@@ -622,6 +697,15 @@ class Workpackage(object):
             elif not self.operation_done(operation_number + 1):
                 # shared operation
                 if operation.shared:
+                    # Other processes can change the states of the
+                    # workpackages of this step and of older steps, the
+                    # cached states must not be used
+                    Workpackage.refresh_states(
+                        self._benchmark.workpackages[self._step.name] +
+                        [workpackage for step_name in
+                         self._step.get_depend_history(self._benchmark)
+                         for workpackage in
+                         self._benchmark.workpackages[step_name]])
                     # wait for all other workpackages and check if shared
                     # operation already finished
                     shared_done = False
@@ -732,6 +816,10 @@ class Workpackage(object):
                 self.benchmark.bench_dir,
                 log_fname.replace('.', '_{}.').format(proc_id) if (('_'+str(proc_id)) not in log_fname) else log_fname))
 
+            # The cached state was copied from the main process, the marker
+            # files can be changed since then
+            self.refresh_state()
+
         # Workpackage already done or error?
         if self.done or self.error:
             # the return value is only relevant for the parallel case, for now
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# JUBE Benchmarking Environment
+# Copyright (C) 2008-2023
+# Forschungszentrum Juelich GmbH, Juelich Supercomputing Centre
+# http://www.fz-juelich.de/jsc/jube
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Analyser related tests"""
+
+from __future__ import (print_function,
+                        unicode_literals,
+                        division)
+
+import gzip
+import re
+import os
+import math
+import statistics
+import shutil
+import tempfile
+import unittest
+import jube2.conf
+import jube2.analyser
+import jube2.jubeio
+import jube2.pattern
+import jube2.parameter
+
+
+class TestAnalyser(unittest.TestCase):
+
+    """Analyser test class"""
+
+    def setUp(self):
+        self.data = ("runtime: 1.5 s\nsteps = 10\n\nruntime: 2.5 s\n" +
+                     "error\nsteps = 20\nlast line 3")
+        self.patterns = [r"runtime:\s+(\d+\.\d+)", r"steps = (\d+)",
+                         r"^steps = (\d+)$", r"line (\d)", r"x*",
+                         r"(\w+) = (\d+)", r"error.*?steps"]
+
+    def _findall(self, patterns, flags=re.MULTILINE):
+        """Return plain findall results for all patterns"""
+        return [re.findall(re.compile(pattern, flags), self.data)
+                for pattern in patterns]
+
+    def test_line_local_state(self):
+        """Test detection of line local regex"""
+        for pattern, line_local in ((r"steps = (\d+)", True),
+                                    (r"^\w+ (?=\d)$", True),
+                                    (r"runtime:\s+(\d+)", False),
+                                    (r"[^a]+", False),
+                                    (r"(?P<n>\d+)", False),
+                                    (r"(a)\1", False)):
+            self.assertEqual(jube2.analyser._compile_regex(
+                pattern, re.MULTILINE)[1], line_local)
+        self.assertFalse(jube2.analyser._compile_regex(
+            r"a.*b", re.MULTILINE + re.DOTALL)[1])
+
+    def test_regex_cache(self):
+        """Test reuse of compiled regex"""
+        regex1 = jube2.analyser._compile_regex("steps", re.MULTILINE)
+        regex2 = jube2.analyser._compile_regex("steps", re.MULTILINE)
+        self.assertIs(regex1, regex2)
+
+    def test_scan_data(self):
+        """Test combined scanning against separate findall calls"""
+        for flags in (re.MULTILINE, re.MULTILINE + re.DOTALL):
+            regex_list = [jube2.analyser._compile_regex(pattern, flags)
+                          for pattern in self.patterns]
+            self.assertEqual(
+                jube2.analyser._scan_data(self.data, regex_list),
+                self._findall(self.patterns, flags))
+
+    def test_stream_mode(self):
+        """Test streaming analyse against reading the whole file"""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        file_path = os.path.join(tmpdir, "stdout")
+        with open(file_path, "w") as file_handle:
+            file_handle.write(self.data * 50)
+        patternset = jube2.pattern.Patternset()
+        patternset.add_pattern(jube2.pattern.Pattern(
+            "runtime", r"runtime:\s+(\d+\.\d+)", content_type="float"))
+        patternset.add_pattern(jube2.pattern.Pattern(
+            "steps", r"steps = (\d+)", content_type="int"))
+        patternset.add_pattern(jube2.pattern.Pattern(
+            "line", r"line (\d)", content_type="int"))
+        patternset.add_pattern(jube2.pattern.Pattern(
+            "error", r"error.*?steps = (\d+)", dotall=True))
+        analyser = jube2.analyser.Analyser("analyse")
+        chunk_size = jube2.conf.ANALYSE_STREAM_CHUNK_SIZE
+        jube2.conf.ANALYSE_STREAM_CHUNK_SIZE = 16
+        self.addCleanup(setattr, jube2.conf, "ANALYSE_STREAM_CHUNK_SIZE",
+                        chunk_size)
+        results = [analyser._analyse_file(
+            file_path, patternset, patternset.copy(),
+            jube2.parameter.Parameterset(), stream=stream)[0]
+            for stream in (False, True)]
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1]["steps_cnt"], 100)
+        self.assertEqual(results[1]["steps_last"], 20)
+        self.assertEqual(results[1]["error_cnt"], 50)
+
+    def test_file_index(self):
+        """Test reuse of matches of unchanged files"""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        file_path = os.path.join(tmpdir, "stdout")
+        with open(file_path, "w") as file_handle:
+            file_handle.write("steps = 10\nsteps = 20\n")
+        file_stat = os.stat(file_path)
+        patternset = jube2.pattern.Patternset()
+        patternset.add_pattern(jube2.pattern.Pattern(
+            "steps", r"steps = (\d+)", content_type="int"))
+        analyser = jube2.analyser.Analyser("analyse")
+
+        def analyse_file():
+            """Analyse file using the index of the previous call"""
+            analyser.file_index = analyser._used_file_index
+            analyser._used_file_index = dict()
+            return analyser._analyse_file(file_path, patternset,
+                                          patternset.copy(),
+                                          jube2.parameter.Parameterset())[0]
+
+        self.assertEqual(analyse_file()["steps_sum"], 30)
+        # Same size and modification time: matches are reused
+        with open(file_path, "w") as file_handle:
+            file_handle.write("steps = 30\nsteps = 40\n")
+        os.utime(file_path, ns=(file_stat.st_atime_ns,
+                                file_stat.st_mtime_ns))
+        self.assertEqual(analyse_file()["steps_sum"], 30)
+        # Changed modification time: file is scanned again
+        os.utime(file_path, ns=(file_stat.st_atime_ns,
+                                file_stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(analyse_file()["steps_sum"], 70)
+        # Changed pattern: file is scanned again
+        patternset.add_pattern(jube2.pattern.Pattern(
+            "steps", r"steps = (\d)", content_type="int"))
+        self.assertEqual(analyse_file()["steps_sum"], 7)
+
+    def test_statistics(self):
+        """Test statistic values of numeric pattern"""
+        pattern = jube2.pattern.Pattern("time", r"(\S+)",
+                                        content_type="float")
+        regex = re.compile(pattern.value)
+        # Percentiles are only calculated on demand
+        match_dict = {"time": dict()}
+        jube2.analyser.Analyser._add_matches(
+            pattern, regex, ["1", "2"], match_dict)
+        self.assertNotIn("sketch", match_dict["time"])
+        jube2.conf.PATTERN_PERCENTILES = [50, 90, 95, 99]
+        try:
+            values = [1e9 + 0.1 * i for i in range(101)]
+            match_dict = {"time": dict()}
+            # Add matches in multiple blocks
+            for i in range(0, len(values), 30):
+                jube2.analyser.Analyser._add_matches(
+                    pattern, regex, [str(value) for value in values[i:i + 30]],
+                    match_dict)
+            result = match_dict["time"]
+            result.update(jube2.analyser._percentiles(result))
+            self.assertEqual(result["cnt"], 101)
+            self.assertEqual(result["first"], values[0])
+            self.assertEqual(result["last"], values[-1])
+            self.assertEqual(result["min"], values[0])
+            self.assertEqual(result["max"], values[-1])
+            self.assertAlmostEqual(result["avg"], statistics.mean(values))
+            self.assertAlmostEqual(result["std"], statistics.stdev(values))
+            self.assertAlmostEqual(result["p50"], statistics.median(values))
+            self.assertAlmostEqual(result["p90"], values[90])
+            # Many matches are aggregated with bounded memory
+            match_dict = {"time": dict()}
+            values = [float((i * 7919) % 100000) for i in range(100000)]
+            for i in range(0, len(values), 500):
+                jube2.analyser.Analyser._add_matches(
+                    pattern, regex,
+                    [str(value) for value in values[i:i + 500]], match_dict)
+            result = match_dict["time"]
+            self.assertLessEqual(len(result["sketch"]),
+                                 jube2.conf.PATTERN_PERCENTILE_SKETCH_SIZE)
+            result.update(jube2.analyser._percentiles(result))
+            self.assertAlmostEqual(result["p50"], 49999.5, delta=200)
+            self.assertAlmostEqual(result["p99"], 98999.01, delta=200)
+            # NaN values cannot be ordered
+            match_dict = {"time": dict()}
+            jube2.analyser.Analyser._add_matches(
+                pattern, regex, ["1", "nan", "2"], match_dict)
+            match_dict["time"].update(
+                jube2.analyser._percentiles(match_dict["time"]))
+            self.assertTrue(math.isnan(match_dict["time"]["p50"]))
+        finally:
+            jube2.conf.PATTERN_PERCENTILES = []
+        # No overflow when calculating the standard deviation
+        match_dict = {"time": dict()}
+        jube2.analyser.Analyser._add_matches(
+            pattern, regex, ["1e155", "1.00001e155"], match_dict)
+        self.assertTrue(math.isnan(match_dict["time"]["sum2"]))
+        self.assertAlmostEqual(match_dict["time"]["std"] / 1e150,
+                               math.sqrt(0.5))
+
+    def test_analyse_result_store(self):
+        """Test writing and reading the analyse database"""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, jube2.conf.ANALYSE_DB_FILENAME)
+        analyser = jube2.analyser.Analyser("analyse")
+        analyser.analyse_result = {
+            "execute": {3: {"time": 1.5, "time_cnt": 2, "name": "a"},
+                        1: {}},
+            "compile": {0: {"size": 10}}}
+        empty_analyser = jube2.analyser.Analyser("empty")
+        jube2.analyser.AnalyseResultStore.write(
+            filename, [analyser, empty_analyser])
+        stores = jube2.analyser.AnalyseResultStore.read(filename)
+        self.assertEqual(sorted(stores), ["analyse", "empty"])
+        self.assertEqual(dict(stores["empty"]), dict())
+        self.assertEqual(list(stores["analyse"]), ["execute", "compile"])
+        self.assertEqual(list(stores["analyse"]["execute"]), [3, 1])
+        self.assertEqual(dict(stores["analyse"]), analyser.analyse_result)
+        self.assertIs(type(stores["analyse"]["execute"][3]["time_cnt"]), int)
+        self.assertRaises(KeyError, lambda: stores["analyse"]["run"])
+
+    def test_analyse_result_xml(self):
+        """Test reading of plain and compressed analyse xml files"""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, jube2.conf.ANALYSE_FILENAME)
+        xml = ('<?xml version="1.0" encoding="UTF-8"?>\n<analyse>'
+               '<analyser name="analyse"><step name="execute">'
+               '<workpackage id="3"><pattern name="time" type="float">'
+               ' 1.5 </pattern><pattern name="name" type="string"/>'
+               '</workpackage><workpackage id="1"/></step></analyser>'
+               '<analyzer name="empty"/></analyse>')
+        expected = {"analyse": {"execute": {3: {"time": 1.5, "name": ""},
+                                            1: {}}},
+                    "empty": {}}
+        with open(filename, "w") as xml_file:
+            xml_file.write(xml)
+        parser = jube2.jubeio.Parser(filename)
+        self.assertEqual(parser.analyse_result_from_xml(), expected)
+        # Only the compressed file exists
+        os.remove(filename)
+        with gzip.open(filename + jube2.conf.COMPRESSED_FILE_SUFFIX,
+                       "wt") as xml_file:
+            xml_file.write(xml)
+        self.assertEqual(parser.analyse_result_from_xml(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
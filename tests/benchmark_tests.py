@@ -22,6 +22,8 @@ from __future__ import (print_function,
                         unicode_literals,
                         division)
 
+import argparse
+import gzip
 import re
 import unittest
 import shutil
@@ -30,6 +32,17 @@ import jube2.step
 import jube2.parameter
 import jube2.benchmark
 import jube2.workpackage
+import jube2.jubeio
+import jube2.conf
+import jube2.main
+import jube2.analyser
+import jube2.pattern
+import jube2.util.util
+
+
+def _benchmark_folder_name(args, benchmark_folder):
+    """Return the name of the given folder inside of a worker process"""
+    return os.path.basename(benchmark_folder)
 
 
 class TestBenchmark(unittest.TestCase):
@@ -74,6 +87,295 @@ class TestBenchmark(unittest.TestCase):
                     "bench_run/000000/"+i+"_execution/work/"+j))
         shutil.rmtree('bench_run')
 
+    def test_workpackage_journal(self):
+        """Test workpackage journal replay and compaction"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.benchmark.new_run()
+        filename = os.path.join(self.benchmark.bench_dir,
+                                jube2.conf.WORKPACKAGES_FILENAME)
+        journal_filename = os.path.join(
+            self.benchmark.bench_dir,
+            jube2.conf.WORKPACKAGES_JOURNAL_FILENAME)
+        self.assertFalse(os.path.exists(journal_filename))
+
+        workpackage = self.benchmark.workpackage_by_id(1)
+        workpackage.env["JUBE_JOURNAL_TEST"] = "a\nb"
+        self.benchmark.update_workpackage_information(filename,
+                                                      [workpackage])
+        self.assertTrue(os.path.isfile(journal_filename))
+        parser = jube2.jubeio.Parser(filename)
+        workpackages = parser.workpackages_from_xml(self.benchmark)[0]
+        self.assertEqual(len(workpackages["execution"]), 4)
+        self.assertEqual(
+            workpackages["execution"][1].env["JUBE_JOURNAL_TEST"], "a\nb")
+
+        self.benchmark.write_workpackage_information(filename)
+        self.assertFalse(os.path.exists(journal_filename))
+        shutil.rmtree('bench_run')
+
+    def test_compressed_workpackages(self):
+        """Test reading of a compressed workpackage file"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.benchmark.new_run()
+        filename = os.path.join(self.benchmark.bench_dir,
+                                jube2.conf.WORKPACKAGES_FILENAME)
+        with open(filename, "rb") as xml_file:
+            with gzip.open(filename + jube2.conf.COMPRESSED_FILE_SUFFIX,
+                           "wb") as compressed_file:
+                compressed_file.write(xml_file.read())
+        os.remove(filename)
+        parser = jube2.jubeio.Parser(filename)
+        workpackages = parser.workpackages_from_xml(self.benchmark)[0]
+        self.assertEqual(
+            [workpackage.parameter_dict["i"]
+             for workpackage in workpackages["execution"]],
+            ["0", "1", "2", "3"])
+        self.assertTrue(all(workpackage.done
+                            for workpackage in workpackages["execution"]))
+        self.assertEqual(jube2.workpackage.Workpackage.id_counter, 4)
+        shutil.rmtree('bench_run')
+
+    def test_analyse_index(self):
+        """Test size of the analyse index"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        os.makedirs("bench_run")
+        file_path = os.path.join("bench_run", "stdout")
+        with open(file_path, "w") as file_handle:
+            for i in range(100000):
+                file_handle.write("time = {0}\n".format(i * 0.5))
+        patternset = jube2.pattern.Patternset()
+        patternset.add_pattern(jube2.pattern.Pattern(
+            "time", r"time = (\S+)", content_type="float"))
+        analyser = jube2.analyser.Analyser("analyse")
+        analyser._analyse_file(file_path, patternset, patternset.copy(),
+                               jube2.parameter.Parameterset())
+        analyser.file_index = analyser._used_file_index
+        self.benchmark.analyser["analyse"] = analyser
+        filename = os.path.join("bench_run",
+                                jube2.conf.ANALYSE_INDEX_FILENAME)
+        self.benchmark.write_analyse_index(filename)
+        # Only aggregated values are stored, the index size does not depend
+        # on the number of matches
+        self.assertLess(os.path.getsize(filename), 1000)
+        analyser.file_index = dict()
+        self.benchmark.read_analyse_index(filename)
+        self.assertEqual(len(analyser.file_index), 1)
+        shutil.rmtree('bench_run')
+
+    def test_workpackage_state_cache(self):
+        """Test cached workpackage states"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.benchmark.new_run()
+        self.assertEqual(self.benchmark.benchmark_status["done"], 4)
+        workpackage = self.benchmark.workpackage_by_id(2)
+        os.remove(os.path.join(workpackage.workpackage_dir,
+                               jube2.conf.WORKPACKAGE_DONE_FILENAME))
+        self.assertTrue(workpackage.done)
+        self.benchmark.refresh_workpackage_states()
+        self.assertFalse(workpackage.done)
+        self.assertTrue(workpackage.started)
+        workpackage.done = True
+        self.assertTrue(workpackage.done)
+        workpackage.remove()
+        self.assertFalse(workpackage.started)
+        shutil.rmtree('bench_run')
+
+    def test_shared_operation_states(self):
+        """Test shared operation checks using the current marker files"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.step = jube2.step.Step(name='execution', depend=set(),
+                                    shared_name='shared')
+        self.step.add_uses(['param_set'])
+        self.step.add_operation(self.operation)
+        self.step.add_operation(jube2.step.Operation(
+            'echo x >> count', shared=True))
+        self.benchmark.steps['execution'] = self.step
+        self.benchmark.new_run()
+        count_filename = os.path.join(self.benchmark.bench_dir,
+                                      'execution_shared', 'count')
+        with open(count_filename) as count_file:
+            self.assertEqual(count_file.read(), "x\n")
+        # Restart a workpackage while the other states are outdated, e.g.
+        # because they were changed by another process
+        workpackage = self.benchmark.workpackage_by_id(0)
+        workpackage.done = False
+        workpackage.operation_done(1, False)
+        for other in self.benchmark.workpackages['execution'][1:]:
+            other._reset_state()
+        workpackage.run()
+        self.assertTrue(workpackage.done)
+        # The shared operation was already executed
+        with open(count_filename) as count_file:
+            self.assertEqual(count_file.read(), "x\n")
+        shutil.rmtree('bench_run')
+
+    def test_workpackage_index(self):
+        """Test workpackage lookup by id"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        post_step = jube2.step.Step(name='post', depend=set(['execution']))
+        post_step.add_operation(jube2.step.Operation('echo "$i"'))
+        self.benchmark.steps['post'] = post_step
+        self.benchmark.new_run()
+        for stepname, workpackages in self.benchmark.workpackages.items():
+            for workpackage in workpackages:
+                self.assertIs(self.benchmark.workpackage_by_id(
+                    workpackage.id), workpackage)
+        self.assertEqual(len(self.benchmark.workpackages['post']), 4)
+        self.assertIsNone(self.benchmark.workpackage_by_id(8))
+
+        parser = jube2.jubeio.Parser(os.path.join(
+            self.benchmark.bench_dir, jube2.conf.WORKPACKAGES_FILENAME))
+        self.benchmark.set_workpackage_information(
+            *parser.workpackages_from_xml(self.benchmark))
+        workpackage = self.benchmark.workpackage_by_id(7)
+        self.assertEqual(workpackage.step.name, 'post')
+        self.benchmark.remove_workpackage(workpackage)
+        self.assertIsNone(self.benchmark.workpackage_by_id(7))
+        shutil.rmtree('bench_run')
+
+    def test_workpackage_closures(self):
+        """Test ancestors and descendants of diamond dependencies"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        for name, depend in (('left', ['execution']),
+                             ('right', ['execution']),
+                             ('join', ['left', 'right'])):
+            step = jube2.step.Step(name=name, depend=set(depend))
+            step.add_operation(jube2.step.Operation('echo "$i"'))
+            self.benchmark.steps[name] = step
+        self.benchmark.new_run()
+        join = self.benchmark.workpackages['join'][0]
+        self.assertEqual(
+            sorted(wp.step.name for wp in join.parent_history),
+            ['execution', 'left', 'right'])
+        self.assertEqual(join.parent_history[0].step.name, 'execution')
+        root = join.parent_history[0]
+        self.assertEqual(sorted(wp.step.name for wp in root.children_future),
+                         ['join', 'left', 'right'])
+        # Cached closures are updated when the graph changes
+        new_child = jube2.workpackage.Workpackage(
+            self.benchmark, self.benchmark.steps['join'],
+            [], jube2.parameter.Parameterset(), workpackage_id=100)
+        join.add_children(new_child)
+        self.assertIn(new_child, root.children_future)
+        shutil.rmtree('bench_run')
+
+    def test_active_prefilter(self):
+        """Test early filtering of inactive parameter combinations"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        for name in ('a', 'b'):
+            self.parameterset.add_parameter(
+                jube2.parameter.Parameter.create_parameter(
+                    name, "0,1,2,3,4,5,6,7,8,9", parameter_type='int'))
+        self.step = jube2.step.Step(name='execution', depend=set(),
+                                    active='$a == $b and $i < 2')
+        self.step.add_uses(['param_set'])
+        self.step.add_operation(self.operation)
+        self.benchmark.steps['execution'] = self.step
+        parametersets = list(self.step._expand_parameterset(
+            self.parameterset.copy(), prefilter=True))
+        self.assertEqual(len(parametersets), 20)
+        self.benchmark.new_run()
+        workpackages = self.benchmark.workpackages['execution']
+        self.assertEqual([wp.id for wp in workpackages], list(range(20)))
+        for workpackage in workpackages:
+            parameter = workpackage.parameterset.constant_parameter_dict
+            self.assertEqual(parameter['a'].value, parameter['b'].value)
+        shutil.rmtree('bench_run')
+
+    def test_parameter_dict_cache(self):
+        """Test cached parameter dict of workpackages"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.benchmark.new_run()
+        workpackage = self.benchmark.workpackage_by_id(1)
+        parameter_dict = workpackage.parameter_dict
+        self.assertEqual(parameter_dict["i"], "1")
+        self.assertIs(workpackage.parameter_dict, parameter_dict)
+        workpackage.parameterset.add_parameter(
+            jube2.parameter.Parameter.create_parameter("i", "5"))
+        self.assertEqual(workpackage.parameter_dict["i"], "5")
+        self.assertEqual(parameter_dict["i"], "1")
+        shutil.rmtree('bench_run')
+
+
+    def test_parallel_loading(self):
+        """Test loading of benchmarks by worker processes"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.benchmark.new_run()
+        self.benchmark.id = -1
+        self.benchmark.new_run()
+        benchmark_folders = ["bench_run/000001", "bench_run/000000"]
+        args = argparse.Namespace(force=False, strict=False, procs=2)
+        benchmarks = list(jube2.main._load_existing_benchmarks(
+            args, benchmark_folders, load_analyse=False))
+        self.assertEqual([benchmark.id for benchmark in benchmarks], [1, 0])
+        for benchmark in benchmarks:
+            workpackage = benchmark.workpackage_by_id(3)
+            self.assertIs(workpackage.benchmark, benchmark)
+            self.assertTrue(workpackage.done)
+        jube2.log.only_console_log()
+        shutil.rmtree('bench_run')
+
+    def test_parallel_loading_in_flight(self):
+        """Test number of benchmarks submitted to worker processes"""
+        submitted = list()
+        submit = jube2.util.util.WorkerPool.submit
+
+        def counting_submit(worker_pool, group, func, args=()):
+            submitted.append(group)
+            submit(worker_pool, group, func, args)
+        jube2.util.util.WorkerPool.submit = counting_submit
+        try:
+            args = argparse.Namespace(procs=2)
+            benchmark_folders = ["bench_run/{0:06d}".format(i)
+                                 for i in range(20)]
+            names = list()
+            for name in jube2.main._map_benchmarks(
+                    _benchmark_folder_name, args, benchmark_folders):
+                names.append(name)
+                self.assertLessEqual(len(submitted), len(names) - 1 + 4)
+        finally:
+            jube2.util.util.WorkerPool.submit = submit
+        self.assertEqual(names, [os.path.basename(benchmark_folder)
+                                 for benchmark_folder in benchmark_folders])
+        self.assertEqual(len(submitted), 20)
+
+    def test_workpackage_states(self):
+        """Test reading of workpackage states without parameters"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        self.benchmark.new_run()
+        filename = os.path.join(self.benchmark.bench_dir,
+                                jube2.conf.WORKPACKAGES_FILENAME)
+        workpackage = self.benchmark.workpackage_by_id(2)
+        workpackage.set_error(True)
+        self.benchmark.update_workpackage_information(filename,
+                                                      [workpackage])
+        os.remove(os.path.join(self.benchmark.workpackage_by_id(
+            1).workpackage_dir, jube2.conf.WORKPACKAGE_DONE_FILENAME))
+        parser = jube2.jubeio.Parser(filename)
+        workpackages = parser.workpackage_states_from_xml(self.benchmark)
+        self.assertEqual(sorted(wp.id for wp in workpackages["execution"]),
+                         [0, 1, 2, 3])
+        for workpackage in workpackages["execution"]:
+            self.assertEqual(workpackage.done, workpackage.id != 1)
+            self.assertEqual(workpackage.error, workpackage.id == 2)
+            self.assertEqual(len(workpackage.parameterset), 0)
+        # Workpackage directories with suffix need the parameters
+        self.benchmark.steps['execution'] = jube2.step.Step(
+            name='execution', depend=set(), suffix='$i')
+        self.assertIsNone(parser.workpackage_states_from_xml(self.benchmark))
+        shutil.rmtree('bench_run')
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -30,6 +30,8 @@ import jube2.step
 import jube2.parameter
 import jube2.benchmark
 import jube2.workpackage
+import jube2.pattern
+import jube2.analyser
 
 
 class TestMultiprocessing(unittest.TestCase):
@@ -76,6 +78,65 @@ class TestMultiprocessing(unittest.TestCase):
                     "bench_run/000000/"+i+"_parallel_execution/work/"+j))
         shutil.rmtree('bench_run')
 
+    def test_multiprocess_multiple_steps(self):
+        """Test shared worker pool for steps using different procs"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        dependentStep = jube2.step.Step(
+            name='dependent_execution', depend=set(['parallel_execution']),
+            procs=3)
+        dependentStep.add_operation(jube2.step.Operation(
+            'echo "$i"', stdout_filename='stdout', work_dir='.'))
+        self.parallelBenchmark.steps['dependent_execution'] = dependentStep
+        self.parallelBenchmark.new_run()
+        self.assertEqual(self.parallelBenchmark.benchmark_status["done"], 8)
+        for i in ["000004", "000005", "000006", "000007"]:
+            self.assertTrue(os.path.isfile(
+                "bench_run/000000/"+i+"_dependent_execution/work/stdout"))
+        shutil.rmtree('bench_run')
+
+    def test_multiprocess_independent_steps(self):
+        """Test concurrent execution of independent steps"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        independentStep = jube2.step.Step(name='independent_execution',
+                                          depend=set())
+        independentStep.add_uses(['param_set'])
+        independentStep.add_operation(jube2.step.Operation(
+            'echo "$i"', stdout_filename='stdout', work_dir='.'))
+        self.parallelBenchmark.steps['independent_execution'] = \
+            independentStep
+        self.parallelBenchmark.new_run(procs=4)
+        status = self.parallelBenchmark.workpackage_status
+        self.assertEqual(status["parallel_execution"]["done"], 4)
+        self.assertEqual(status["independent_execution"]["done"], 4)
+        shutil.rmtree('bench_run')
+
+    def test_multiprocess_analyse(self):
+        """Test analyse using worker processes"""
+        if os.path.isdir("bench_run"):
+            shutil.rmtree('bench_run')
+        patternset = jube2.pattern.Patternset("pattern_set")
+        patternset.add_pattern(jube2.pattern.Pattern(
+            "number", r"^(\d+)$", content_type="int"))
+        analyser = jube2.analyser.Analyser("analyse")
+        analyser.add_uses(["pattern_set"])
+        analyser.add_analyse("parallel_execution",
+                             jube2.analyser.Analyser.AnalyseFile("stdout"))
+        self.parallelBenchmark.patternsets["pattern_set"] = patternset
+        self.parallelBenchmark.analyser["analyse"] = analyser
+        analyser.benchmark = self.parallelBenchmark
+        self.parallelBenchmark.new_run()
+        self.parallelBenchmark.analyse(show_info=False)
+        serial_result = analyser.analyse_result
+        self.parallelBenchmark.analyse(show_info=False, procs=3)
+        self.assertEqual(analyser.analyse_result, serial_result)
+        self.assertEqual(
+            sorted(result["number"] for result in
+                   serial_result["parallel_execution"].values()),
+            [0, 1, 2, 3])
+        shutil.rmtree('bench_run')
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -113,6 +113,22 @@ class TestParameter(unittest.TestCase):
         self.assertRaises(RuntimeError,
                           self.para_error.substitute_and_evaluate, [])
 
+    def test_final_history(self):
+        """Test history of final substituted parameters"""
+        parameterset = jube2.parameter.Parameterset()
+        parameterset.add_parameter(self.para_cons)
+        static_par = list(
+            jube2.parameter.Parameter.create_parameter(
+                "test3", "$test 1,$test 2").expand())[1]
+        final_par, changed = static_par.substitute_and_evaluate(
+            [parameterset], final_sub=True)
+        self.assertTrue(changed)
+        self.assertTrue(final_par.is_fixed)
+        self.assertEqual(final_par.value, "3 2")
+        self.assertIs(final_par.based_on, static_par.based_on)
+        self.assertEqual(final_par.based_on_value, "$test 1,$test 2")
+        self.assertFalse(hasattr(final_par, "__dict__"))
+
     def test_etree_repr(self):
         """Test Etree repr"""
         etree = self.para_temp.etree_repr()
@@ -236,6 +252,25 @@ class TestParameterSet(unittest.TestCase):
         parameterset.delete_parameter("a_parameter")
         self.assertFalse(self.para_export in parameterset)
 
+    def test_copy_on_write(self):
+        """Test shared parameters of copied parametersets"""
+        parameterset = self.parameterset.copy()
+        self.assertIs(parameterset["test"], self.parameterset["test"])
+        parameterset.add_parameter(self.para_export)
+        parameterset.delete_parameter("test")
+        self.assertEqual(sorted(parameterset.all_parameter_names),
+                         ["test2"])
+        self.assertEqual(sorted(self.parameterset.all_parameter_names),
+                         ["test", "test2"])
+        self.assertIs(self.parameterset["test2"], self.para_temp)
+        self.parameterset.update_parameterset(self.parameterset3)
+        self.assertIs(parameterset["test2"], self.para_export)
+        empty = jube2.parameter.Parameterset()
+        empty.add_parameterset(self.parameterset2)
+        empty.add_parameter(self.para_cons)
+        self.assertEqual(len(self.parameterset2), 2)
+        self.assertEqual(len(empty), 3)
+
     def test_compatible(self):
         """Test compatible parameterset"""
         parameterset = self.parameterset.copy()
@@ -304,6 +339,28 @@ class TestParameterSet(unittest.TestCase):
         self.assertEqual(parameterset2[self.para_sub.name].value,
                          self.para_sub.value)
 
+    def test_substitution_order(self):
+        """Test substitution of dependent parameters"""
+        parameterset = jube2.parameter.Parameterset()
+        for name, value in (("c", "$b $b"), ("b", "$a+1"), ("a", "1"),
+                            ("x", "$y"), ("y", "$x")):
+            parameterset.add_parameter(
+                jube2.parameter.Parameter.create_parameter(name, value))
+        parameterset.parameter_substitution()
+        self.assertEqual(parameterset["c"].value, "1+1 1+1")
+        self.assertEqual(parameterset["x"].value, "$y")
+        # Changes are passed on to the dependent parameters of a copy
+        parameter_a = parameterset["a"]
+        new_parameterset = parameterset.copy()
+        new_parameterset.add_parameter(
+            jube2.parameter.Parameter.create_parameter("a", "2"))
+        new_parameterset.add_parameter(
+            jube2.parameter.Parameter.create_parameter("b", "$a+1"))
+        new_parameterset.parameter_substitution()
+        self.assertEqual(new_parameterset["b"].value, "2+1")
+        self.assertEqual(parameterset["a"], parameter_a)
+        self.assertEqual(parameterset["b"].value, "1+1")
+
     def test_etree_repr(self):
         """Etree repr check"""
         etree = self.parameterset.etree_repr()
@@ -74,5 +74,50 @@ class TestResultDatabase(unittest.TestCase):
         os.remove(self.databaseFileName)
 
 
+    def _database_data(self, data, primekeys):
+        """Create database data of a single benchmark"""
+        database_data = jube2.result_types.database.Database.DatabaseData(
+            jube2.result_types.genericresult.GenericResult.KeyValuesData(
+                self.dataBaseTableName), primekeys, None)
+        for name, values in data:
+            database_data._data[
+                jube2.result_types.genericresult.GenericResult.DataKey(
+                    name)] = values
+        database_data._benchmark_ids = [0]
+        return database_data
+
+    def test_bulk_transaction(self):
+        """Test column migration and bulk transactions"""
+        os.remove(self.databaseFileName)
+        with jube2.result_types.database.bulk_transaction():
+            self._database_data([("id", [1, 2]), ("a", [None, 2.5]),
+                                 ("b", ["x", "y"])], ["id"]).create_result(
+                                     True, self.databaseFileName)
+            # data is only visible after the transaction is committed
+            con = sqlite3.connect(self.databaseFileName)
+            self.assertEqual(con.execute(
+                "SELECT name FROM sqlite_master").fetchall(), [])
+            con.close()
+            self._database_data([("id", [2, 3]), ("b", ["z", "w"]),
+                                 ("c", [1, 1])], ["id"]).create_result(
+                                     True, self.databaseFileName)
+        con = sqlite3.connect(self.databaseFileName)
+        table_info = con.execute("PRAGMA table_info({0})".format(
+            self.dataBaseTableName)).fetchall()
+        self.assertEqual([(i[1], i[2].lower()) for i in table_info],
+                         [("id", "int"), ("b", "text"), ("c", "int")])
+        self.assertEqual(con.execute(
+            "SELECT * FROM {0} ORDER BY id".format(
+                self.dataBaseTableName)).fetchall(),
+            [(1, "x", None), (2, "z", 1), (3, "w", 1)])
+        con.close()
+
+        # primary keys cannot be changed
+        self.assertRaises(ValueError, self._database_data(
+            [("id", [1]), ("b", ["x"])], ["b"]).create_result,
+            True, self.databaseFileName)
+        os.remove(self.databaseFileName)
+
+
 if __name__ == "__main__":
     unittest.main()
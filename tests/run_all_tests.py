@@ -26,8 +26,10 @@ import unittest
 from parameter_tests import TestParameter, TestParameterSet
 from multiprocessing_tests import TestMultiprocessing
 from pattern_tests import TestPattern
+from analyser_tests import TestAnalyser
 from benchmark_tests import TestBenchmark
 from result_database_tests import TestResultDatabase
+from warehouse_tests import TestWarehouse
 from example_tests.example_cycle_tests import TestCycleExample
 from example_tests.example_dependencies_tests import TestDependenciesExample
 from example_tests.example_do_log_tests import TestDoLogExample
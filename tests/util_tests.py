@@ -22,8 +22,19 @@ from __future__ import (print_function,
                         unicode_literals,
                         division)
 
+import glob
+import multiprocessing
+import os
+import shutil
+import tempfile
 import unittest
 import jube2.util.util
+import jube2.conf
+
+
+def _shell_evaluation(cmd):
+    """Evaluate cmd as shell snippet inside of a worker process"""
+    return jube2.util.util.script_evaluation(cmd, "shell")
 
 
 class TestUtil(unittest.TestCase):
@@ -108,6 +119,115 @@ class TestUtil(unittest.TestCase):
         for i in range(len(test_text)):
             self.assertEqual(jube2.util.util.substitution(text=test_text[i], substitution_dict=test_substitution_dict),test_result_text[i])
 
+    def test_substitution_template(self):
+        """Test precompiled substitution templates"""
+        substitution_dict = {'a': 'x', 'b': '', 'c': '$a', 'ab': 'y'}
+        for text, result in (("$a ${a}b $b$HOME", "x xb $HOME"),
+                             ("$ab-$unknown $", "y-$unknown $$"),
+                             ("$unknown$a", "$unknownx"),
+                             ("${$b}", "${}"), ("$c", "$a")):
+            self.assertEqual(
+                jube2.util.util.substitution(text, substitution_dict),
+                result)
+            self.assertEqual(
+                jube2.util.util._substitution(text, substitution_dict),
+                result)
+        template = jube2.util.util.substitution_template("$a")
+        self.assertIs(jube2.util.util.substitution_template("$a"), template)
+        self.assertEqual(template.substitute({'a': 1}), "1")
+        self.assertIsNone(template.substitute({'a': "$b"}))
+        self.assertIsNone(
+            jube2.util.util.substitution_template("$$a").substitute({}))
+
+    def test_script_evaluation(self):
+        """Test shell script evaluation"""
+        self.assertEqual(
+            jube2.util.util.script_evaluation("echo a; echo b >&2", "shell"),
+            "a\n")
+        self.assertEqual(jube2.util.util.script_evaluation(
+            "cd /; export JUBE_TEST=1; printf x", "shell"), "x")
+        # State changes of a snippet must not influence other snippets
+        self.assertEqual(jube2.util.util.script_evaluation(
+            "printf \"$JUBE_TEST\"", "shell"), "")
+        self.assertNotEqual(
+            jube2.util.util.script_evaluation("pwd", "shell"), "/\n")
+        self.assertRaises(RuntimeError, jube2.util.util.script_evaluation,
+                          "exit 1", "shell")
+        self.assertTrue(jube2.util.util.script_evaluation(
+            "echo $$", "shell").strip().isdigit())
+        # Snippets depending on time or files are evaluated on every use
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cmd = ("echo x >> {0}; wc -l < {0}").format(
+                os.path.join(tmp_dir, "counter"))
+            self.assertEqual(
+                jube2.util.util.script_evaluation(cmd, "shell").strip(), "1")
+            self.assertEqual(
+                jube2.util.util.script_evaluation(cmd, "shell").strip(), "2")
+            jube2.conf.SHELL_RESULT_CACHE = True
+            try:
+                self.assertEqual(
+                    jube2.util.util.script_evaluation(cmd, "shell").strip(),
+                    "3")
+                self.assertEqual(
+                    jube2.util.util.script_evaluation(cmd, "shell").strip(),
+                    "3")
+            finally:
+                jube2.conf.SHELL_RESULT_CACHE = False
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_script_evaluation_background(self):
+        """Test output of background jobs in shell script evaluation"""
+        self.assertEqual(jube2.util.util.script_evaluation(
+            "(sleep 0.3; echo late) & echo early", "shell"), "early\nlate\n")
+        self.assertEqual(
+            jube2.util.util.script_evaluation("echo next", "shell"), "next\n")
+
+    def test_shell_process_cleanup(self):
+        """Test removal of shell process files in worker processes"""
+        before = set(glob.glob(os.path.join(tempfile.gettempdir(), "jube_*")))
+        pool = multiprocessing.Pool(4)
+        try:
+            self.assertEqual(
+                pool.map(_shell_evaluation,
+                         ["echo {0}".format(i) for i in range(16)],
+                         chunksize=1),
+                ["{0}\n".format(i) for i in range(16)])
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(
+            set(glob.glob(os.path.join(tempfile.gettempdir(), "jube_*"))),
+            before)
+
+    def test_python_evaluation(self):
+        """Test python script evaluation"""
+        for cmd, result in (("2*3", "6"), ("x = 2\nreturn x * 3", "6"),
+                            ("','.join(str(i) for i in range(3))", "0,1,2"),
+                            ("os.path.basename('/a/b')", "b")):
+            self.assertEqual(
+                jube2.util.util.script_evaluation(cmd, "python"), result)
+            self.assertEqual(
+                jube2.util.util.script_evaluation(cmd, "python"), result)
+        self.assertIn("2*3", jube2.util.util._PYTHON_RESULT_CACHE)
+        # Results which might depend on any state are not memorised
+        self.assertNotIn("os.path.basename('/a/b')",
+                         jube2.util.util._PYTHON_RESULT_CACHE)
+        jube2.util.util.script_evaluation("__import__('os').sep", "python")
+        self.assertNotIn("__import__('os').sep",
+                         jube2.util.util._PYTHON_RESULT_CACHE)
+        # Imported modules can return a different result on every call
+        for cmd in ("import random\nreturn random.random()",
+                    "import time\nreturn repr(time.time())"):
+            jube2.util.util.script_evaluation(cmd, "python")
+            self.assertNotIn(cmd, jube2.util.util._PYTHON_RESULT_CACHE)
+        # Snippets cannot access JUBE internals
+        self.assertRaises(NameError, jube2.util.util.script_evaluation,
+                          "LOGGER", "python")
+        self.assertTrue(jube2.util.util.eval_bool("1 < 2"))
+        self.assertRaises(ValueError, jube2.util.util.eval_bool, "1 <")
+
     def test_ensure_list(self):
         """Test ensure_list"""
         self.assertEqual(jube2.util.util.ensure_list(42),[42])
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# JUBE Benchmarking Environment
+# Copyright (C) 2008-2023
+# Forschungszentrum Juelich GmbH, Juelich Supercomputing Centre
+# http://www.fz-juelich.de/jsc/jube
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""Result warehouse related tests"""
+
+from __future__ import (print_function,
+                        unicode_literals,
+                        division)
+
+import unittest
+import os
+import shutil
+import jube2.warehouse
+from jube2.result_types.keyvaluesresult import KeyValuesResult
+
+
+class TestWarehouse(unittest.TestCase):
+
+    """Result warehouse test class"""
+
+    class BenchmarkStub(object):
+
+        """Benchmark providing a single fixed result"""
+
+        def __init__(self, benchmark_id, rows):
+            self.id = benchmark_id
+            self.name = "warehouse"
+            self.bench_dir = "warehouse_run/{0:06d}".format(benchmark_id)
+            self.results_order = ["result"]
+            self.results = {"result": self}
+            self._rows = rows
+
+        def create_result_data(self, style=None, select=None, exclude=None):
+            result_data = KeyValuesResult.KeyValuesData("result")
+            result_data.add_key_value_data(
+                [KeyValuesResult.DataKey("nodes"),
+                 KeyValuesResult.DataKey("time", format_string=".2f"),
+                 KeyValuesResult.DataKey("time", title="Time")],
+                self._rows, self.id)
+            return result_data
+
+    def setUp(self):
+        if os.path.isdir("warehouse_run"):
+            shutil.rmtree("warehouse_run")
+        os.makedirs("warehouse_run/000000")
+        self.warehouse = jube2.warehouse.Warehouse("warehouse_run/test.db")
+
+    def tearDown(self):
+        self.warehouse.close()
+        shutil.rmtree("warehouse_run")
+
+    def test_ingest_and_query(self):
+        """Test ingest and query of results"""
+        self.warehouse.ingest(self.BenchmarkStub(
+            0, [["1", "10.50", "10.5"], ["2", "5.00", "5"],
+                ["16", "", "x"]]))
+        self.warehouse.ingest(self.BenchmarkStub(1, [["4", "3.00", "3"]]))
+        self.assertEqual(self.warehouse.benchmark_ids, [0, 1])
+        self.assertEqual(self.warehouse.fingerprint(0),
+                         jube2.warehouse.benchmark_fingerprint(
+                             "warehouse_run/000000"))
+
+        columns, rows = self.warehouse.query("result")
+        self.assertEqual(columns, [("nodes", None), ("time", ".2f"),
+                                   ("Time", None)])
+        self.assertEqual([row[0] for row in rows], [0, 0, 0, 1])
+        self.assertEqual(
+            [jube2.warehouse.display_value(row[2], ".2f") for row in rows],
+            ["10.50", "5.00", "", "3.00"])
+
+        # Numbers are filtered and sorted numerically
+        columns, rows = self.warehouse.query(
+            "result", select=["nodes"], condition="$nodes > 1",
+            sort_names=["nodes"])
+        self.assertEqual(rows, [(0, 2), (1, 4), (0, 16)])
+
+        # Ingesting a benchmark again replaces its data
+        self.warehouse.ingest(self.BenchmarkStub(0, [["8", "1.00", "1"]]))
+        columns, rows = self.warehouse.query("result", benchmark_ids=[0],
+                                             select=["nodes"])
+        self.assertEqual(rows, [(0, 8)])
+        self.warehouse.remove(0)
+        self.assertEqual(self.warehouse.benchmark_ids, [1])
+
+        # An interrupted ingest keeps the stored data
+        def interrupt(result_name, columns):
+            raise KeyboardInterrupt()
+        self.warehouse._add_columns = interrupt
+        self.assertRaises(KeyboardInterrupt, self.warehouse.ingest,
+                          self.BenchmarkStub(1, [["2", "1.00", "1"]]))
+        self.assertEqual(self.warehouse.benchmark_ids, [1])
+        columns, rows = self.warehouse.query("result", select=["nodes"])
+        self.assertEqual(rows, [(1, 4)])
+
+
+if __name__ == "__main__":
+    unittest.main()